@@ -1,15 +1,23 @@
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
-from datetime import datetime
+import hmac
 import os
-from dash import Dash
+import threading
+import uuid
+from functools import lru_cache
+
 import dash_bootstrap_components as dbc
-import plotly.io as pio
-import plotly.graph_objects as go
+from dash import Dash, dcc, html, ctx, no_update
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from flask import request
+
+import compression
+import export
+import jobs
+from data_manager import DataManager
+from data_store import read_cache
+from figure_cache import FigureCache
+from figure_pool import FigurePool
+from metrics import REGISTRY, register, register_response_bytes, timed_callback
 
 # Custom CSS
 CUSTOM_CSS = {
@@ -50,8 +58,67 @@ CARD_BODY_STYLE = {
     'padding': '1.25rem'
 }
 
-# Load the CSV files
-ai_subset = pd.read_excel("Salary_Sub.xlsx")
+# Load the postings through the columnar cache (built on first run). The
+# manager holds the current Dataset (filter engine, count cubes, metadata)
+# and swaps in a rebuilt one when the workbook changes. With
+# DASHBOARD_DATA_STORE set, the postings come from a store that ingest.py
+# appends daily batches to instead.
+DATA_STORE = os.environ.get('DASHBOARD_DATA_STORE')
+if DATA_STORE:
+    data_manager = DataManager(DATA_STORE, loader=read_cache)
+else:
+    data_manager = DataManager("Salary_Sub.xlsx")
+
+# Rendered figures keyed on (tab, dataset version, canonical filters). Set
+# DASHBOARD_FIGURE_CACHE_DIR to share them between gunicorn workers.
+figure_cache = FigureCache(
+    max_bytes=int(os.environ.get('DASHBOARD_FIGURE_CACHE_MB', 64)) << 20,
+    disk_dir=os.environ.get('DASHBOARD_FIGURE_CACHE_DIR') or None,
+    version=data_manager.dataset.version
+)
+data_manager.on_swap(lambda dataset: figure_cache.set_version(dataset.version))
+
+# The default view of every tab is built on a worker pool into the figure
+# cache whenever a dataset is loaded, so each tab's first paint is a cache
+# hit (DASHBOARD_PREWARM=0 disables it; see figure_pool.py for the pool)
+PREWARM = os.environ.get('DASHBOARD_PREWARM', '1') != '0'
+figure_pool = FigurePool()
+
+
+def default_filters(metadata):
+    return dict(years=metadata.year_range, skills=None, education_levels=None, skill_subcategories=None)
+
+
+def prewarm(dataset):
+    filters = default_filters(dataset.metadata)
+    tabs = [tab for tab in ('education', 'degree', 'salary', 'city')
+            if not figure_cache.contains(figure_cache.key(tab, dataset.version, filters))]
+    values = figure_pool.build(dataset, [(tab, filters) for tab in tabs])
+    # A dataset swapped out meanwhile must not refill the cache it was cleared from
+    if dataset is not data_manager.dataset:
+        return
+    for tab, value in zip(tabs, values):
+        figure_cache.put(figure_cache.key(tab, dataset.version, filters), value)
+
+
+def start_prewarm(dataset):
+    if PREWARM:
+        threading.Thread(target=prewarm, args=(dataset,), name='prewarm', daemon=True).start()
+
+
+data_manager.on_swap(start_prewarm)
+start_prewarm(data_manager.dataset)
+
+# Tab callbacks run single-flight per page session, or as background jobs
+# when DASHBOARD_BACKGROUND_CALLBACKS is set (see jobs.py)
+job_manager = jobs.background_manager()
+single_flight = jobs.SingleFlight()
+TAB_CALLBACK_OPTIONS = jobs.callback_options(job_manager)
+
+# Poll the workbook for changes every DASHBOARD_WATCH_INTERVAL seconds (0 disables)
+WATCH_INTERVAL = float(os.environ.get('DASHBOARD_WATCH_INTERVAL', 30))
+if WATCH_INTERVAL > 0:
+    data_manager.watch(WATCH_INTERVAL)
 
 # Dash app setup with Bootstrap theme
 app = Dash(__name__, external_stylesheets=[
@@ -185,390 +252,302 @@ app.index_string = '''
 </html>
 '''
 
-app.layout = dbc.Container([
-    html.H1("Education Trends in the AI Job Market", 
-            className="text-center my-3",
-            style={'color': COLORS['text']}),
-    
-    dcc.Tabs(id='tabs', value='tab1', children=[
-        dcc.Tab(label='Education Requirements', value='tab1', children=[
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H5("Education Requirements Analysis", className="mb-0")
-                ]),
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardHeader([
-                                    html.H5("Filters", className="mb-0")
-                                ]),
-                                dbc.CardBody([
-                                    dcc.Dropdown(
-                                        id='skill-filter',
-                                        options=[{'label': skill, 'value': skill} for skill in ai_subset['skill_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='education-filter',
-                                        options=[{'label': edu, 'value': edu} for edu in ai_subset['min_edulevels_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Education Level",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='subcategory-filter',
-                                        options=[{'label': subcat, 'value': subcat} for subcat in ai_subset['skill_subcategory_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill Subcategory",
-                                        className="mb-3"
-                                    ),
-                                    dcc.RangeSlider(
-                                        id='year-filter',
-                                        min=ai_subset['year'].min(),
-                                        max=ai_subset['year'].max(),
-                                        marks={year: str(year) for year in range(ai_subset['year'].min(), ai_subset['year'].max()+1, 2)},
-                                        value=[ai_subset['year'].min(), ai_subset['year'].max()],
-                                        className="mb-3"
-                                    )
-                                ])
-                            ], className="mb-4")
-                        ], width=3),
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardBody([
-                                    dcc.Graph(id='education-requirements-plot')
-                                ])
-                            ])
-                        ], width=9)
-                    ])
-                ])
-            ], className="mt-0 card-no-hover")
-        ]),
-        
-        dcc.Tab(label='Degree Trends', value='tab2', children=[
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H5("Degree Requirements Analysis", className="mb-0")
-                ]),
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardHeader([
-                                    html.H5("Filters", className="mb-0")
-                                ]),
-                                dbc.CardBody([
-                                    dcc.Dropdown(
-                                        id='degree-skill-filter',
-                                        options=[{'label': skill, 'value': skill} for skill in ai_subset['skill_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='degree-education-filter',
-                                        options=[{'label': edu, 'value': edu} for edu in ai_subset['min_edulevels_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Education Level",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='degree-subcategory-filter',
-                                        options=[{'label': subcat, 'value': subcat} for subcat in ai_subset['skill_subcategory_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill Subcategory",
-                                        className="mb-3"
-                                    ),
-                                    dcc.RangeSlider(
-                                        id='degree-year-filter',
-                                        min=ai_subset['year'].min(),
-                                        max=ai_subset['year'].max(),
-                                        marks={year: str(year) for year in range(ai_subset['year'].min(), ai_subset['year'].max()+1, 2)},
-                                        value=[ai_subset['year'].min(), ai_subset['year'].max()],
-                                        className="mb-3"
-                                    )
-                                ])
-                            ], className="mb-4")
-                        ], width=3),
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardBody([
-                                    dcc.Graph(id='degree-trend-plot')
-                                ])
-                            ])
-                        ], width=9)
-                    ])
-                ])
-            ], className="mt-0 card-no-hover")
+# Tabs: (tab value, label, card title, filter id prefix, graph id)
+TABS = [
+    ('tab1', 'Education Requirements', "Education Requirements Analysis", '', 'education-requirements-plot'),
+    ('tab2', 'Degree Trends', "Degree Requirements Analysis", 'degree-', 'degree-trend-plot'),
+    ('tab3', 'Salary Analysis', "Salary Distribution Analysis", 'salary-', 'salary-distribution-plot'),
+    ('tab4', 'Geographic Analysis', "Geographic Distribution Analysis", 'geo-', 'education-by-city-plot'),
+]
+
+
+def filter_options(data, filters, search_value=None, facets=('skills', 'education_levels', 'skill_subcategories')):
+    # Dropdown options labelled with their posting counts given the other
+    # filters (facets.py); skills are the top matches of the search
+    counts = data.facets.counts(facets=facets, **filters)
+    options = {}
+    for facet in facets:
+        if facet == 'skills':
+            options[facet] = data.skill_index.options(search_value, filters['skills'], counts=counts[facet])
+        else:
+            options[facet] = data.facets.options(facet, counts[facet], filters[facet])
+    return options
+
+
+def filter_panel(prefix, metadata, options):
+    # The skill/education/subcategory dropdowns and year slider of one tab
+    return dbc.Card([
+        dbc.CardHeader([
+            html.H5("Filters", className="mb-0")
         ]),
-        
-        dcc.Tab(label='Salary Analysis', value='tab3', children=[
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H5("Salary Distribution Analysis", className="mb-0")
-                ]),
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardHeader([
-                                    html.H5("Filters", className="mb-0")
-                                ]),
-                                dbc.CardBody([
-                                    dcc.Dropdown(
-                                        id='salary-skill-filter',
-                                        options=[{'label': skill, 'value': skill} for skill in ai_subset['skill_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='salary-education-filter',
-                                        options=[{'label': edu, 'value': edu} for edu in ai_subset['min_edulevels_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Education Level",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='salary-subcategory-filter',
-                                        options=[{'label': subcat, 'value': subcat} for subcat in ai_subset['skill_subcategory_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill Subcategory",
-                                        className="mb-3"
-                                    ),
-                                    dcc.RangeSlider(
-                                        id='salary-year-filter',
-                                        min=ai_subset['year'].min(),
-                                        max=ai_subset['year'].max(),
-                                        marks={year: str(year) for year in range(ai_subset['year'].min(), ai_subset['year'].max()+1, 2)},
-                                        value=[ai_subset['year'].min(), ai_subset['year'].max()],
-                                        className="mb-3"
-                                    )
-                                ])
-                            ], className="mb-4")
-                        ], width=3),
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardBody([
-                                    dcc.Graph(id='salary-distribution-plot')
-                                ])
+        dbc.CardBody([
+            dcc.Dropdown(
+                id=f'{prefix}skill-filter',
+                # The most frequent skills; the rest are searched on the server
+                options=options['skills'],
+                multi=True,
+                placeholder="Filter by Skill",
+                search_order='original',
+                className="mb-3"
+            ),
+            dcc.Dropdown(
+                id=f'{prefix}education-filter',
+                options=options['education_levels'],
+                multi=True,
+                placeholder="Filter by Education Level",
+                className="mb-3"
+            ),
+            dcc.Dropdown(
+                id=f'{prefix}subcategory-filter',
+                options=options['skill_subcategories'],
+                multi=True,
+                placeholder="Filter by Skill Subcategory",
+                className="mb-3"
+            ),
+            dcc.RangeSlider(
+                id=f'{prefix}year-filter',
+                min=metadata.year_min,
+                max=metadata.year_max,
+                marks=metadata.marks,
+                value=metadata.year_range,
+                className="mb-3"
+            )
+        ])
+    ], className="mb-4")
+
+
+def analysis_tab(value, label, title, prefix, graph_id, metadata, options):
+    return dcc.Tab(label=label, value=value, children=[
+        dbc.Card([
+            dbc.CardHeader([
+                html.H5(title, className="mb-0")
+            ]),
+            dbc.CardBody([
+                dbc.Row([
+                    dbc.Col([
+                        filter_panel(prefix, metadata, options)
+                    ], width=3),
+                    dbc.Col([
+                        dbc.Card([
+                            dbc.CardBody([
+                                # Spinner over the current figure while its callback is pending
+                                dcc.Loading(
+                                    dcc.Graph(id=graph_id),
+                                    delay_show=200,
+                                    overlay_style={'visibility': 'visible', 'opacity': 0.5}
+                                ),
+                                # Name of the figure template the graph is drawn with,
+                                # so the callback need not upload the figure to know it
+                                dcc.Store(id=f'{graph_id}-drawn')
                             ])
-                        ], width=9)
-                    ])
+                        ])
+                    ], width=9)
                 ])
-            ], className="mt-0 card-no-hover")
-        ]),
+            ])
+        ], className="mt-0 card-no-hover")
+    ])
+
+
+@lru_cache(maxsize=1)
+def build_layout(data):
+    metadata = data.metadata
+    options = filter_options(data, default_filters(metadata))
+    return dbc.Container([
+        html.H1("Education Trends in the AI Job Market", 
+                className="text-center my-3",
+                style={'color': COLORS['text']}),
         
-        dcc.Tab(label='Geographic Analysis', value='tab4', children=[
-            dbc.Card([
-                dbc.CardHeader([
-                    html.H5("Geographic Distribution Analysis", className="mb-0")
-                ]),
-                dbc.CardBody([
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardHeader([
-                                    html.H5("Filters", className="mb-0")
-                                ]),
-                                dbc.CardBody([
-                                    dcc.Dropdown(
-                                        id='geo-skill-filter',
-                                        options=[{'label': skill, 'value': skill} for skill in ai_subset['skill_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='geo-education-filter',
-                                        options=[{'label': edu, 'value': edu} for edu in ai_subset['min_edulevels_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Education Level",
-                                        className="mb-3"
-                                    ),
-                                    dcc.Dropdown(
-                                        id='geo-subcategory-filter',
-                                        options=[{'label': subcat, 'value': subcat} for subcat in ai_subset['skill_subcategory_name'].unique()],
-                                        multi=True,
-                                        placeholder="Filter by Skill Subcategory",
-                                        className="mb-3"
-                                    ),
-                                    dcc.RangeSlider(
-                                        id='geo-year-filter',
-                                        min=ai_subset['year'].min(),
-                                        max=ai_subset['year'].max(),
-                                        marks={year: str(year) for year in range(ai_subset['year'].min(), ai_subset['year'].max()+1, 2)},
-                                        value=[ai_subset['year'].min(), ai_subset['year'].max()],
-                                        className="mb-3"
-                                    )
-                                ])
-                            ], className="mb-4")
-                        ], width=3),
-                        dbc.Col([
-                            dbc.Card([
-                                dbc.CardBody([
-                                    dcc.Graph(id='education-by-city-plot')
-                                ])
-                            ])
-                        ], width=9)
-                    ])
-                ])
-            ], className="mt-0 card-no-hover")
+        dcc.Tabs(id='tabs', value='tab1', children=[
+            analysis_tab(*tab, metadata, options) for tab in TABS
         ])
+    ], fluid=True, style={'padding': '0'})
+
+
+def serve_layout():
+    # Evaluated on every page load, so options and year bounds follow a
+    # reloaded dataset; the layout itself is only rebuilt when it changes.
+    # Each page load gets its own session id for the single-flight keys
+    return html.Div([
+        dcc.Store(id='session-id', data=uuid.uuid4().hex),
+        build_layout(data_manager.dataset)
     ])
-], fluid=True, style={'padding': '0'})
+
+
+app.layout = serve_layout
+
+def render_figure(tab, data, filters, session=None, drawn=None):
+    # The figure, or a Patch of it for a graph drawn with the same template,
+    # and the template name for the graph's drawn store
+    # Plotting modules are imported on the first render, not at startup
+    import figures
+
+    def render():
+        return figure_cache.figure(tab, data.version, filters, lambda: figures.RENDERERS[tab](data, filters))
+
+    # Background jobs are cancelled by the job manager instead
+    if session is None or job_manager is not None:
+        figure = render()
+    else:
+        figure = single_flight.run((session, tab), render)
+    template = figures.TEMPLATES[tab]
+    return template.patch(figure, drawn), template.name
+
+
+def register_filter_options(prefix):
+    # A tab's dropdown options follow its other filters and what is typed
+    # into the skill dropdown
+    @app.callback(
+        [Output(f'{prefix}skill-filter', 'options'),
+         Output(f'{prefix}education-filter', 'options'),
+         Output(f'{prefix}subcategory-filter', 'options')],
+        [Input(f'{prefix}skill-filter', 'search_value'),
+         Input(f'{prefix}skill-filter', 'value'),
+         Input(f'{prefix}education-filter', 'value'),
+         Input(f'{prefix}year-filter', 'value'),
+         Input(f'{prefix}subcategory-filter', 'value')],
+        prevent_initial_call=True
+    )
+    @timed_callback('filter_options')
+    def update_filter_options(search_value, skills, education_levels, years, skill_subcategories):
+        data = data_manager.dataset
+        filters = dict(years=years, skills=skills, education_levels=education_levels,
+                       skill_subcategories=skill_subcategories)
+        if ctx.triggered_prop_ids.keys() == {f'{prefix}skill-filter.search_value'}:
+            # Typing only changes the skill matches
+            return filter_options(data, filters, search_value, facets=('skills',))['skills'], no_update, no_update
+        options = filter_options(data, filters, search_value)
+        return options['skills'], options['education_levels'], options['skill_subcategories']
+
+
+for _, _, _, prefix, _ in TABS:
+    register_filter_options(prefix)
+
+
+def skip_unless_visible(tab_value, active_tab, drawn):
+    # Hidden tabs are rendered lazily: nothing is computed until the tab is
+    # opened, and re-opening a tab whose figure is already drawn is a no-op
+    if active_tab != tab_value:
+        raise PreventUpdate
+    if ctx.triggered_id == 'tabs' and drawn:
+        raise PreventUpdate
+
 
 @app.callback(
     [Output('education-requirements-plot', 'figure'),
-     Output('degree-trend-plot', 'figure'),
-     Output('salary-distribution-plot', 'figure'),
-     Output('education-by-city-plot', 'figure')],
-    [Input('skill-filter', 'value'),
+     Output('education-requirements-plot-drawn', 'data')],
+    [Input('tabs', 'value'),
+     Input('skill-filter', 'value'),
      Input('education-filter', 'value'),
      Input('year-filter', 'value'),
-     Input('subcategory-filter', 'value'),
+     Input('subcategory-filter', 'value')],
+    [State('education-requirements-plot-drawn', 'data'),
+     State('session-id', 'data')],
+    **TAB_CALLBACK_OPTIONS
+)
+@timed_callback('education')
+def update_education_plot(active_tab, skills, education_levels, years, skill_subcategories, drawn, session):
+    skip_unless_visible('tab1', active_tab, drawn)
+    data = data_manager.dataset
+    filters = dict(years=years, skills=skills, education_levels=education_levels,
+                   skill_subcategories=skill_subcategories)
+    return render_figure('education', data, filters, session, drawn)
+
+
+@app.callback(
+    [Output('degree-trend-plot', 'figure'),
+     Output('degree-trend-plot-drawn', 'data')],
+    [Input('tabs', 'value'),
      Input('degree-skill-filter', 'value'),
      Input('degree-education-filter', 'value'),
      Input('degree-year-filter', 'value'),
-     Input('degree-subcategory-filter', 'value'),
+     Input('degree-subcategory-filter', 'value')],
+    [State('degree-trend-plot-drawn', 'data'),
+     State('session-id', 'data')],
+    **TAB_CALLBACK_OPTIONS
+)
+@timed_callback('degree')
+def update_degree_plot(active_tab, degree_skills, degree_education, degree_years, degree_subcategories, drawn, session):
+    skip_unless_visible('tab2', active_tab, drawn)
+    data = data_manager.dataset
+    filters = dict(years=degree_years, skills=degree_skills, education_levels=degree_education,
+                   skill_subcategories=degree_subcategories)
+    return render_figure('degree', data, filters, session, drawn)
+
+
+@app.callback(
+    [Output('salary-distribution-plot', 'figure'),
+     Output('salary-distribution-plot-drawn', 'data')],
+    [Input('tabs', 'value'),
      Input('salary-skill-filter', 'value'),
      Input('salary-education-filter', 'value'),
      Input('salary-year-filter', 'value'),
-     Input('salary-subcategory-filter', 'value'),
+     Input('salary-subcategory-filter', 'value')],
+    [State('salary-distribution-plot-drawn', 'data'),
+     State('session-id', 'data')],
+    **TAB_CALLBACK_OPTIONS
+)
+@timed_callback('salary')
+def update_salary_plot(active_tab, salary_skills, salary_education, salary_years, salary_subcategories, drawn, session):
+    skip_unless_visible('tab3', active_tab, drawn)
+    data = data_manager.dataset
+    filters = dict(years=salary_years, skills=salary_skills, education_levels=salary_education,
+                   skill_subcategories=salary_subcategories)
+    return render_figure('salary', data, filters, session, drawn)
+
+
+@app.callback(
+    [Output('education-by-city-plot', 'figure'),
+     Output('education-by-city-plot-drawn', 'data')],
+    [Input('tabs', 'value'),
      Input('geo-skill-filter', 'value'),
      Input('geo-education-filter', 'value'),
      Input('geo-year-filter', 'value'),
-     Input('geo-subcategory-filter', 'value')]
+     Input('geo-subcategory-filter', 'value')],
+    [State('education-by-city-plot-drawn', 'data'),
+     State('session-id', 'data')],
+    **TAB_CALLBACK_OPTIONS
 )
-def update_plots(skills, education_levels, years, skill_subcategories,
-                degree_skills, degree_education, degree_years, degree_subcategories,
-                salary_skills, salary_education, salary_years, salary_subcategories,
-                geo_skills, geo_education, geo_years, geo_subcategories):
-    
-    # Education Requirements Plot
-    filtered_df = ai_subset[(ai_subset['year'] >= years[0]) & (ai_subset['year'] <= years[1])]
-    if skills:
-        filtered_df = filtered_df[filtered_df['skill_name'].isin(skills)]
-    if education_levels:
-        filtered_df = filtered_df[filtered_df['min_edulevels_name'].isin(education_levels)]
-    if skill_subcategories:
-        filtered_df = filtered_df[filtered_df['skill_subcategory_name'].isin(skill_subcategories)]
-
-    # Plot 1: Education Requirements by Skill
-    skill_edu_counts = filtered_df.groupby('min_edulevels_name').size().reset_index(name='count')
-    fig1 = px.bar(
-        skill_edu_counts,
-        x='min_edulevels_name',
-        y='count',
-        color='min_edulevels_name',
-        title="Education Requirements by Skill",
-        template="plotly_white",
-        color_discrete_sequence=px.colors.sequential.Viridis
-    )
-    fig1.update_layout(
-        xaxis_title="Minimum Education Level",
-        yaxis_title="Number of Job Listings",
-        title_font_size=20,
-        showlegend=False,
-        font=dict(family="Inter, sans-serif", size=14),
-        plot_bgcolor='white',
-        paper_bgcolor='white'
-    )
+@timed_callback('city')
+def update_city_plot(active_tab, geo_skills, geo_education, geo_years, geo_subcategories, drawn, session):
+    skip_unless_visible('tab4', active_tab, drawn)
+    data = data_manager.dataset
+    filters = dict(years=geo_years, skills=geo_skills, education_levels=geo_education,
+                   skill_subcategories=geo_subcategories)
+    return render_figure('city', data, filters, session, drawn)
 
-    # Degree Trends Plot
-    degree_df = ai_subset[(ai_subset['year'] >= degree_years[0]) & (ai_subset['year'] <= degree_years[1])]
-    if degree_skills:
-        degree_df = degree_df[degree_df['skill_name'].isin(degree_skills)]
-    if degree_education:
-        degree_df = degree_df[degree_df['min_edulevels_name'].isin(degree_education)]
-    if degree_subcategories:
-        degree_df = degree_df[degree_df['skill_subcategory_name'].isin(degree_subcategories)]
-
-    # Plot 2: Degree Trend Over Time
-    edu_trend = degree_df.groupby(['year', 'min_edulevels_name']).size().reset_index(name='count')
-    fig2 = px.line(
-        edu_trend,
-        x='year',
-        y='count',
-        color='min_edulevels_name',
-        title="Degree Requirements Over Time",
-        template="plotly_white",
-        color_discrete_sequence=['#440154', '#3b528b', '#21918c', '#5ec962', '#b8de29', '#fde725']
-    )
-    fig2.update_layout(
-        xaxis_title="Year",
-        yaxis_title="Number of Job Listings",
-        font=dict(family="Inter, sans-serif", size=14),
-        plot_bgcolor='white',
-        paper_bgcolor='white'
-    )
-
-    # Salary Distribution Plot
-    salary_df = ai_subset[(ai_subset['year'] >= salary_years[0]) & (ai_subset['year'] <= salary_years[1])]
-    if salary_skills:
-        salary_df = salary_df[salary_df['skill_name'].isin(salary_skills)]
-    if salary_education:
-        salary_df = salary_df[salary_df['min_edulevels_name'].isin(salary_education)]
-    if salary_subcategories:
-        salary_df = salary_df[salary_df['skill_subcategory_name'].isin(salary_subcategories)]
-
-    # Plot 3: Salary Distribution by Education Level
-    fig3 = px.box(
-        salary_df,
-        x='min_edulevels_name',
-        y='salary',
-        color='min_edulevels_name',
-        title="Salary Distribution by Education",
-        template="plotly_white",
-        color_discrete_sequence=px.colors.sequential.Viridis
-    )
-    fig3.update_layout(
-        xaxis_title="Minimum Education Level",
-        yaxis_title="Salary (USD)",
-        showlegend=False,
-        font=dict(family="Inter, sans-serif", size=14),
-        plot_bgcolor='white',
-        paper_bgcolor='white'
-    )
 
-    # Geographic Analysis Plot
-    geo_df = ai_subset[(ai_subset['year'] >= geo_years[0]) & (ai_subset['year'] <= geo_years[1])]
-    if geo_skills:
-        geo_df = geo_df[geo_df['skill_name'].isin(geo_skills)]
-    if geo_education:
-        geo_df = geo_df[geo_df['min_edulevels_name'].isin(geo_education)]
-    if geo_subcategories:
-        geo_df = geo_df[geo_df['skill_subcategory_name'].isin(geo_subcategories)]
-
-    # Plot 4: Education Level by City
-    top_cities = geo_df['city_name'].value_counts().nlargest(10).index
-    city_edu_counts = geo_df[geo_df['city_name'].isin(top_cities)]\
-        .groupby('city_name').size().reset_index(name='count')
-    
-    fig4 = px.bar(
-        city_edu_counts,
-        x='city_name',
-        y='count',
-        color='city_name',
-        title="Education Level by Top Cities",
-        template="plotly_white",
-        color_discrete_sequence=px.colors.sequential.Viridis
-    )
-    fig4.update_layout(
-        xaxis_title="City - Minimum Education Level",
-        yaxis_title="Number of Job Listings",
-        showlegend=False,
-        font=dict(family="Inter, sans-serif", size=14),
-        plot_bgcolor='white',
-        paper_bgcolor='white'
-    )
+server = app.server
 
-    return fig1, fig2, fig3, fig4
+# Latency histograms and figure cache counters, in Prometheus text format
+REGISTRY.add_collector('dashboard_figure_cache', 'Figure cache counters and size.', 'gauge',
+                       figure_cache.stats, label='stat')
+register(server)
+# gzip / brotli for the callback responses and the Dash assets
+compression.register(server, int(os.environ.get('DASHBOARD_COMPRESS_MIN_BYTES', compression.MIN_BYTES)))
+# Registered after compression, so it measures the figure or Patch as built
+register_response_bytes(server, {
+    'education-requirements-plot': 'education',
+    'degree-trend-plot': 'degree',
+    'salary-distribution-plot': 'salary',
+    'education-by-city-plot': 'city',
+})
+# GET /export streams the rows behind the tab filters as CSV or Parquet
+export.register(server, lambda: data_manager.dataset)
+REGISTRY.add_collector('dashboard_single_flight', 'Tab renders run and superseded requests dropped.', 'gauge',
+                       single_flight.stats, label='stat')
+REGISTRY.add_collector('dashboard_dataset', 'Loaded postings and reload counters.', 'gauge',
+                       data_manager.stats, label='stat')
 
-server = app.server
+# POST /reload with an X-Reload-Token header rebuilds the dataset in the
+# background; only enabled when DASHBOARD_RELOAD_TOKEN is set
+RELOAD_TOKEN = os.environ.get('DASHBOARD_RELOAD_TOKEN')
+if RELOAD_TOKEN:
+    @server.route('/reload', methods=['POST'])
+    def reload_dataset():
+        if not hmac.compare_digest(request.headers.get('X-Reload-Token', ''), RELOAD_TOKEN):
+            return {'error': 'invalid reload token'}, 403
+        started = data_manager.reload()
+        return {'started': started, 'version': data_manager.dataset.version}, 202
 
 if __name__ == "__main__":
     app.run(debug=False)
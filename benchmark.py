@@ -0,0 +1,745 @@
+"""Benchmarks for the dashboard.
+
+    python benchmark.py micro [--repeat N]        (the default without a command)
+    python benchmark.py callbacks [--scales 1 10 100] [--output results.json] [--compare old.json]
+    python benchmark.py payload [--scales 1 10]
+    python benchmark.py startup [--budget-ms 2500] [--top 15]
+    python benchmark.py facets [--scales 1 10 100] [--budget-ms 30]
+    python benchmark.py firstpaint [--scales 1 10] [--workers 4]
+    python benchmark.py ingest [--chunk-rows 4000]
+
+`micro` times the data path on Salary_Sub.xlsx: the filter engine against
+the chained boolean indexing the callbacks used before it (one Series.isin
+and one frame copy per dropdown), and the count cubes against groupby and
+the engine's row scan, the salary quantile index against sorting the
+selected salaries, and the top-city engine against the original
+two-pass value_counts + groupby (plus its exact and approximate modes on
+synthetic high-cardinality locations), and the skill search index against
+scanning every skill name, with the size of the skill dropdown options.
+
+`callbacks` generates synthetic postings with the dashboard's schema at
+multiples of the real row count, drives every tab callback through Dash's
+/_dash-update-component endpoint with representative filter combinations,
+and reports p50/p95/p99 latency, response bytes and peak memory. Results
+are written as JSON; --compare prints the p95 change against an earlier
+run.
+
+`payload` builds every tab's figure on synthetic postings and reports its
+serialized size as sent (NumPy arrays as base64 typed arrays) against the
+same figure with plain number lists, the gzip and brotli sizes, and the
+encode time with the json and orjson engines.
+
+`facets` times the dropdown option counts (all three facets of one
+interaction, as the options callback computes them) from the bitmap index
+against one row scan per facet on synthetic postings, and fails (exit
+status 1) when the p95 at any scale is over the budget.
+
+`firstpaint` writes synthetic postings to a columnar cache and times
+building the default view of all four tabs serially and on the thread and
+process figure pools (figure_pool.py), then the first callback of every
+tab as served cold and after the prewarm that runs when a dataset loads.
+
+`ingest` appends Salary_Sub.xlsx to empty column stores with ingest.py,
+once as the workbook and once as per-year workbooks newest first (so
+every batch after the first is merged back into year order), and fails
+when either store reads back different from load_postings.
+
+`startup` imports the app in fresh interpreters with -X importtime, prints
+the slowest imports and fails (exit status 1) when the median cold start
+exceeds the budget.
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from count_cube import DIMENSIONS, CountCube
+from data_store import load_postings
+from filter_engine import FILTER_COLUMNS, FilterEngine
+
+# Rows in Salary_Sub.xlsx; synthetic scales are multiples of it
+BASE_ROWS = 16473
+
+# Shares and median salaries of the education levels in Salary_Sub.xlsx
+EDUCATION_LEVELS = {
+    "Associate degree": (0.016, 62000),
+    "Bachelor's degree": (0.549, 98000),
+    "High school or GED": (0.036, 52000),
+    "Master's degree": (0.094, 115000),
+    "No Education Listed": (0.277, 85000),
+    "Ph.D. or professional degree": (0.028, 135000),
+}
+SALARY_MISSING = 0.85
+
+# Tab callbacks: name -> (tab value, graph id)
+TABS = {
+    'education': ('tab1', 'education-requirements-plot'),
+    'degree': ('tab2', 'degree-trend-plot'),
+    'salary': ('tab3', 'salary-distribution-plot'),
+    'city': ('tab4', 'education-by-city-plot'),
+}
+# Filter component id suffix -> filter keyword
+FILTER_INPUTS = {
+    'skill-filter': 'skills',
+    'education-filter': 'education_levels',
+    'year-filter': 'years',
+    'subcategory-filter': 'skill_subcategories',
+}
+
+
+def chained_filter(df, years, skills=None, education_levels=None, skill_subcategories=None):
+    # The original per-tab filter from update_plots
+    filtered_df = df[(df['year'] >= years[0]) & (df['year'] <= years[1])]
+    if skills:
+        filtered_df = filtered_df[filtered_df['skill_name'].isin(skills)]
+    if education_levels:
+        filtered_df = filtered_df[filtered_df['min_edulevels_name'].isin(education_levels)]
+    if skill_subcategories:
+        filtered_df = filtered_df[filtered_df['skill_subcategory_name'].isin(skill_subcategories)]
+    return filtered_df
+
+
+def filter_scenarios(df):
+    years = (int(df['year'].min()), int(df['year'].max()))
+    mid = (years[0] + years[1]) // 2
+    skills = list(df['skill_name'].value_counts().index[:5])
+    education = list(df['min_edulevels_name'].value_counts().index[:2])
+    subcategories = list(df['skill_subcategory_name'].value_counts().index[:1])
+    return {
+        'full range': dict(years=years),
+        'year range': dict(years=(mid - 2, mid + 2)),
+        'skills': dict(years=years, skills=skills),
+        'skills + education': dict(years=years, skills=skills, education_levels=education),
+        'all filters': dict(years=(mid - 2, mid + 2), skills=skills, education_levels=education,
+                            skill_subcategories=subcategories),
+    }
+
+
+def best_of(func, repeat):
+    # Best wall time in milliseconds over `repeat` runs
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def bench_filters(df, repeat):
+    engine = FilterEngine(df)
+    print(f"{'scenario':<20}{'rows':>8}{'chained ms':>12}{'select ms':>10}{'frame ms':>10}{'speedup':>9}")
+    for name, kwargs in filter_scenarios(df).items():
+        expected = chained_filter(df, **kwargs)
+        positions = np.arange(len(df))[engine.select(**kwargs)]
+        assert np.array_equal(df.index.get_indexer(expected.index), positions), name
+
+        chained = best_of(lambda: chained_filter(df, **kwargs), repeat)
+        select = best_of(lambda: engine.select(**kwargs), repeat)
+        frame = best_of(lambda: engine.filter(**kwargs), repeat)
+        print(f"{name:<20}{len(positions):>8}{chained:>12.3f}{select:>10.3f}{frame:>10.3f}{chained / frame:>8.1f}x")
+
+
+def bench_counts(df, repeat):
+    engine = FilterEngine(df)
+    start = time.perf_counter()
+    cubes = {
+        'full cube': CountCube.build(engine),
+        'rollup cube': CountCube.build(engine, DIMENSIONS[:-1]),
+    }
+    build = (time.perf_counter() - start) * 1000
+    sizes = ', '.join(f"{name}: {'skipped' if cube is None else f'{len(cube)} cells'}"
+                      for name, cube in cubes.items())
+    print(f"\ncount cubes built in {build:.1f} ms ({sizes})")
+
+    charts = {
+        'education': ['min_edulevels_name'],
+        'degree': ['year', 'min_edulevels_name'],
+        'city': ['city_name'],
+    }
+    kwargs = filter_scenarios(df)['skills']
+    print(f"{'chart':<12}{'groupby ms':>12}{'scan ms':>10}{'cube ms':>10}")
+    for chart, columns in charts.items():
+        cube = next((c for c in cubes.values() if c is not None and set(columns) <= set(c.coords)), None)
+        groupby = best_of(lambda: chained_filter(df, **kwargs).groupby(columns, observed=True).size(), repeat)
+        scan = best_of(lambda: engine.count_by(columns, **kwargs), repeat)
+        cubed = best_of(lambda: cube.count_by(columns, **kwargs), repeat) if cube is not None else float('nan')
+        print(f"{chart:<12}{groupby:>12.3f}{scan:>10.3f}{cubed:>10.3f}")
+
+
+def bench_salary(df, repeat):
+    from box_stats import box_summary
+    from quantile_index import SalaryIndex
+
+    engine = FilterEngine(df)
+    salaries = engine.df['salary'].to_numpy(dtype=float)
+    index = SalaryIndex(engine, salaries)
+    print(f"\n{'salary boxes':<20}{'sort ms':>10}{'exact ms':>10}{'approx ms':>11}")
+    for name, kwargs in filter_scenarios(df).items():
+        kwargs = {key: value for key, value in kwargs.items() if key in ('years', 'education_levels')}
+        rows = engine.select(**kwargs)
+        codes = engine.codes['min_edulevels_name'][rows]
+        selection = index.partitions(**kwargs)
+        sort = best_of(lambda: box_summary(codes, salaries[rows]), repeat)
+        timings = []
+        for mode in ('exact', 'approx'):
+            index.mode = mode
+            timings.append(best_of(lambda: index.summary(selection), repeat))
+        print(f"{name:<20}{sort:>10.3f}{timings[0]:>10.3f}{timings[1]:>11.3f}")
+
+
+def original_top_cities(df, years, skills=None, education_levels=None, skill_subcategories=None):
+    # The geographic tab before CityTopK: value_counts, nlargest, then a
+    # second isin + groupby pass to recount the top cities
+    geo_df = chained_filter(df, years, skills, education_levels, skill_subcategories)
+    top_cities = geo_df['city_name'].value_counts().nlargest(10).index
+    return geo_df[geo_df['city_name'].isin(top_cities)].groupby('city_name', observed=True).size()
+
+
+def bench_top_k(df, repeat, cities=200_000):
+    from top_k import CityTopK
+
+    engine = FilterEngine(df)
+    top_k = CityTopK(engine, engine, mode='exact')
+    print(f"\n{'top cities':<20}{'two-pass ms':>12}{'top-k ms':>10}")
+    for name, kwargs in filter_scenarios(df).items():
+        expected = original_top_cities(df, **kwargs)
+        assert sorted(top_k.top(**kwargs)['count']) == sorted(expected), name
+        original = best_of(lambda: original_top_cities(df, **kwargs), repeat)
+        top = best_of(lambda: top_k.top(**kwargs), repeat)
+        print(f"{name:<20}{original:>12.3f}{top:>10.3f}")
+
+    # High-cardinality locations: exact cubes against the per-year summary
+    synthetic = synthetic_postings(BASE_ROWS * 20, cities=cities)
+    engine = FilterEngine(synthetic)
+    modes = {mode: CityTopK(engine, engine, mode=mode) for mode in ('exact', 'approx')}
+    kwargs = filter_scenarios(synthetic)['full range']
+    exact = modes['exact'].top(**kwargs)
+    approx = modes['approx'].top(**kwargs)
+    overlap = len(set(exact['city_name']) & set(approx['city_name']))
+    print(f"{len(synthetic)} postings, {cities} cities: exact "
+          f"{best_of(lambda: modes['exact'].top(**kwargs), repeat):.3f} ms, approx "
+          f"{best_of(lambda: modes['approx'].top(**kwargs), repeat):.3f} ms, "
+          f"max error {int(approx['error'].max())} postings, {overlap}/{len(exact)} of the exact top cities")
+
+
+def scan_skills(names, counts, query, limit):
+    # Every skill whose words are prefixed by the query's words, by count
+    from skill_search import tokenize
+
+    words = tokenize(query)
+    found = [(-count, name) for name, count in zip(names, counts)
+             if all(any(token.startswith(word) for token in tokenize(name)) for word in words)]
+    return [name for _, name in sorted(found)[:limit]]
+
+
+def bench_skill_search(df, repeat, skills=20_000):
+    from skill_search import SEARCH_LIMIT, SkillIndex
+
+    rng = np.random.default_rng(0)
+    words = [f"{prefix}{suffix}" for prefix in ('data', 'machine', 'deep', 'cloud', 'graph', 'stream', 'vision')
+             for suffix in ('', 'base', 'ops', 'flow', 'net')]
+    names = sorted({f"{' '.join(rng.choice(words, size=rng.integers(1, 4)))} {i}" for i in range(skills)})
+    counts = zipf_codes(rng, len(names), len(names) * 10, 1.1)
+    counts = np.bincount(counts, minlength=len(names))
+    real = SkillIndex.from_engine(FilterEngine(df))
+    print(f"\n{'skill search':<20}{'scan ms':>10}{'index ms':>10}{'matches':>9}")
+    for label, index, query in (('real: learn', real, 'learn'), ('synthetic: mach', None, 'mach'),
+                                ('synthetic: deep da', None, 'deep da')):
+        source_names, source_counts = (real.names, real.counts) if index else (names, counts)
+        index = index or SkillIndex(names, counts)
+        expected = scan_skills(source_names, source_counts, query, SEARCH_LIMIT)
+        assert index.search(query) == expected, label
+        scan = best_of(lambda: scan_skills(source_names, source_counts, query, SEARCH_LIMIT), repeat)
+        search = best_of(lambda: index.search(query), repeat)
+        print(f"{label:<20}{scan:>10.3f}{search:>10.3f}{len(expected):>9}")
+    full = len(json.dumps([{'label': name, 'value': name} for name in names]))
+    initial = len(json.dumps(SkillIndex(names, counts).options()))
+    print(f"skill dropdown options for {len(names)} skills: {full} bytes all, {initial} bytes initial (x4 tabs)")
+
+
+def zipf_codes(rng, n, size, exponent):
+    # Heavy-tailed codes: code k is drawn with probability ~ 1 / (k + 1)^exponent
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.choice(n, size=size, p=weights / weights.sum())
+
+
+def synthetic_postings(rows, seed=0, skills=500, subcategories=12, cities=None, years=(2010, 2023)):
+    """Synthetic postings with the dashboard's schema and realistic skew.
+
+    Posting volume grows ~25% a year, skills and cities follow Zipf-like
+    distributions, each skill belongs to one subcategory, education levels
+    and the share of missing salaries match Salary_Sub.xlsx, and salaries are
+    log-normal around a per-education median. City cardinality grows with
+    the square root of the row count unless given.
+    """
+    rng = np.random.default_rng(seed)
+    if cities is None:
+        cities = int(min(50_000, 1500 * max(1.0, rows / BASE_ROWS) ** 0.5))
+
+    year_values = np.arange(years[0], years[1] + 1)
+    year_weights = 1.25 ** (year_values - years[0])
+    year = np.sort(rng.choice(year_values, size=rows, p=year_weights / year_weights.sum()))
+
+    skill = zipf_codes(rng, skills, rows, 1.1)
+    skill_subcategory = rng.integers(0, subcategories, size=skills)
+    city = zipf_codes(rng, cities, rows, 1.2)
+
+    shares = np.array([share for share, _ in EDUCATION_LEVELS.values()])
+    medians = np.array([median for _, median in EDUCATION_LEVELS.values()], dtype=float)
+    education = rng.choice(len(shares), size=rows, p=shares / shares.sum())
+    salary = rng.lognormal(np.log(medians[education]), 0.35).round(-2)
+    salary[rng.random(rows) < SALARY_MISSING] = np.nan
+
+    def categorical(codes, prefix, n):
+        return pd.Categorical.from_codes(codes, categories=[f"{prefix} {i:05d}" for i in range(n)])
+
+    df = pd.DataFrame({
+        'year': year,
+        'skill_name': categorical(skill, 'Skill', skills),
+        'skill_subcategory_name': categorical(skill_subcategory[skill], 'Subcategory', subcategories),
+        'min_edulevels_name': pd.Categorical.from_codes(education, categories=list(EDUCATION_LEVELS)),
+        'city_name': categorical(city, 'City', cities),
+        'salary': salary,
+    })
+    df.attrs['version'] = f"synthetic-{rows}-{seed}"
+    return df
+
+
+def update_request(dependency, tab_value, filters):
+    # Body of a /_dash-update-component call for one tab callback
+    inputs = []
+    for item in dependency['inputs']:
+        if item['id'] == 'tabs':
+            value = tab_value
+        else:
+            suffix = next(key for key in FILTER_INPUTS if item['id'].endswith(key))
+            value = filters.get(FILTER_INPUTS[suffix])
+            if FILTER_INPUTS[suffix] == 'years':
+                value = [int(y) for y in value]
+        inputs.append(dict(item, value=value))
+    # "..graph.figure...graph-drawn.data.." for the two outputs
+    outputs = [dict(zip(('id', 'property'), item.split('.')))
+               for item in dependency['output'].strip('.').split('...')]
+    changed = next(item for item in dependency['inputs'] if item['id'] != 'tabs')
+    return {
+        'output': dependency['output'],
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': inputs,
+        'state': [dict(item, value=None) for item in dependency['state']],
+        'changedPropIds': [f"{changed['id']}.{changed['property']}"],
+    }
+
+
+def figure_dependencies(client):
+    # Graph id -> the callback drawing its figure
+    return {item.split('.')[0]: dep for dep in client.get('/_dash-dependencies').get_json()
+            for item in dep['output'].strip('.').split('...') if item.endswith('.figure')}
+
+
+def percentiles(samples):
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3)}
+
+
+def bench_callbacks(scales, repeat, seed=0):
+    # Imported here: loading the app pulls in Dash and the real workbook.
+    # Prewarming would compete with the timed requests
+    os.environ.setdefault('DASHBOARD_PREWARM', '0')
+    import Dashboard_Final as dashboard
+    from dataset import Dataset
+    from figure_cache import FigureCache
+
+    # Every request must run the callback, not hit the figure cache
+    dashboard.figure_cache = FigureCache(max_bytes=0)
+    client = dashboard.server.test_client()
+    dependencies = figure_dependencies(client)
+
+    runs = []
+    for scale in scales:
+        rows = int(BASE_ROWS * scale)
+        start = time.perf_counter()
+        df = synthetic_postings(rows, seed=seed)
+        generate = time.perf_counter() - start
+        start = time.perf_counter()
+        dashboard.data_manager.swap(Dataset(df))
+        build = time.perf_counter() - start
+        print(f"\nscale {scale}x: {rows} rows (generated in {generate:.2f} s, indexed in {build:.2f} s)")
+        print(f"{'tab':<11}{'scenario':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>10}")
+
+        results = []
+        for tab, (tab_value, graph_id) in TABS.items():
+            for scenario, filters in filter_scenarios(df).items():
+                body = update_request(dependencies[graph_id], tab_value, filters)
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    response = client.post('/_dash-update-component', json=body)
+                    samples.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        raise RuntimeError(f"{tab}/{scenario}: HTTP {response.status_code}")
+                result = dict(tab=tab, scenario=scenario, response_bytes=len(response.data), **percentiles(samples))
+                results.append(result)
+                print(f"{tab:<11}{scenario:<20}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                      f"{result['p99_ms']:>9.2f}{result['response_bytes']:>10}")
+
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"peak RSS so far: {peak_rss:.0f} MB")
+        runs.append({
+            'scale': scale,
+            'rows': rows,
+            'index_seconds': round(build, 3),
+            'peak_rss_mb': round(peak_rss, 1),
+            'results': results,
+        })
+        del df
+    return runs
+
+
+def expand_typed_arrays(value):
+    # The figure with typed arrays decoded back into plain lists
+    if isinstance(value, dict):
+        if 'bdata' in value and 'dtype' in value:
+            array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+            if 'shape' in value:
+                array = array.reshape([int(n) for n in value['shape'].split(',')])
+            return array.tolist()
+        return {key: expand_typed_arrays(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [expand_typed_arrays(item) for item in value]
+    return value
+
+
+def bench_payloads(scales, repeat, seed=0):
+    import figures
+    from compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+    from dataset import Dataset
+    from figure_cache import orjson
+
+    engines = ['json'] + (['orjson'] if orjson is not None else [])
+    for scale in scales:
+        rows = int(BASE_ROWS * scale)
+        df = synthetic_postings(rows, seed=seed)
+        data = Dataset(df)
+        print(f"\nscale {scale}x: {rows} rows")
+        print(f"{'tab':<11}{'scenario':<20}{'typed':>9}{'lists':>9}{'gzip':>8}{'br':>8}"
+              + ''.join(f"{engine + ' ms':>11}" for engine in engines))
+        for tab in TABS:
+            for scenario, filters in filter_scenarios(df).items():
+                figure = figures.RENDERERS[tab](data, filters)
+                body = figure.to_json(validate=False).encode()
+                plain = json.dumps(expand_typed_arrays(json.loads(body)), separators=(',', ':')).encode()
+                gzipped = len(gzip.compress(body, compresslevel=GZIP_LEVEL))
+                brotli_size = len(brotli.compress(body, quality=BROTLI_QUALITY)) if brotli is not None else 0
+                timings = [best_of(lambda: figure.to_json(validate=False, engine=engine), repeat)
+                           for engine in engines]
+                print(f"{tab:<11}{scenario:<20}{len(body):>9}{len(plain):>9}{gzipped:>8}"
+                      f"{brotli_size or '-':>8}" + ''.join(f"{ms:>11.2f}" for ms in timings))
+        del df, data
+
+
+def bench_firstpaint(scales, repeat, workers, seed=0):
+    import tempfile
+
+    os.environ.setdefault('DASHBOARD_PREWARM', '0')
+    import Dashboard_Final as dashboard
+    from data_store import read_cache, write_cache
+    from dataset import Dataset
+    from figure_cache import FigureCache
+    from figure_pool import FigurePool
+
+    client = dashboard.server.test_client()
+    dependencies = figure_dependencies(client)
+    pools = {kind: FigurePool(kind, workers) for kind in ('serial', 'thread', 'process')}
+    try:
+        for scale in scales:
+            rows = int(BASE_ROWS * scale)
+            with tempfile.TemporaryDirectory() as tmp:
+                # Process workers open the dataset from its columnar cache
+                write_cache(synthetic_postings(rows, seed=seed), os.path.join(tmp, 'store'))
+                data = Dataset(read_cache(os.path.join(tmp, 'store')))
+                dashboard.data_manager.swap(data)
+                filters = dashboard.default_filters(data.metadata)
+                requests = [(tab, filters) for tab in TABS]
+                print(f"\nscale {scale}x: {rows} rows, {workers} workers, {os.cpu_count()} CPUs")
+                print(f"{'all four default figures':<28}{'first ms':>10}{'p50 ms':>9}{'p95 ms':>9}")
+                for kind, pool in pools.items():
+                    # The first build starts the pool (and loads the workers' dataset)
+                    start = time.perf_counter()
+                    pool.build(data, requests)
+                    first = (time.perf_counter() - start) * 1000
+                    samples = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        pool.build(data, requests)
+                        samples.append(time.perf_counter() - start)
+                    result = percentiles(samples)
+                    print(f"{kind:<28}{first:>10.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}")
+
+                print(f"{'first callback per tab':<28}{'cold ms':>10}{'warm ms':>9}")
+                body = {tab: update_request(dependencies[graph_id], tab_value, filters)
+                        for tab, (tab_value, graph_id) in TABS.items()}
+                samples = {tab: {'cold': [], 'warm': []} for tab in TABS}
+                for _ in range(repeat):
+                    for mode in ('cold', 'warm'):
+                        dashboard.figure_cache = FigureCache(version=data.version)
+                        if mode == 'warm':
+                            dashboard.prewarm(data)
+                        for tab in TABS:
+                            start = time.perf_counter()
+                            response = client.post('/_dash-update-component', json=body[tab])
+                            samples[tab][mode].append(time.perf_counter() - start)
+                            if response.status_code != 200:
+                                raise RuntimeError(f"{tab}: HTTP {response.status_code}")
+                for tab in TABS:
+                    cold, warm = (np.median(samples[tab][mode]) * 1000 for mode in ('cold', 'warm'))
+                    print(f"{tab:<28}{cold:>10.1f}{warm:>9.1f}")
+    finally:
+        for pool in pools.values():
+            pool.shutdown()
+
+
+def bench_ingest(path, chunk_rows):
+    import tempfile
+
+    from data_store import read_cache
+    from ingest import ingest
+
+    expected = load_postings(path)
+    matched = True
+    with tempfile.TemporaryDirectory() as tmp:
+        batches = []
+        for year in sorted(expected['year'].unique(), reverse=True):
+            # Excel rather than CSV: read_csv would parse the text TRUE / FALSE
+            # of company_is_staffing as booleans
+            batches.append(os.path.join(tmp, f"{year}.xlsx"))
+            expected[expected['year'] == year].to_excel(batches[-1], index=False)
+        for name, paths in (('workbook', [path]), ('back-dated', batches)):
+            store = os.path.join(tmp, name.replace(' ', '-'))
+            start = time.perf_counter()
+            ingest(store, paths, chunk_rows)
+            elapsed = time.perf_counter() - start
+            try:
+                # Dictionaries are in arrival order in the store, sorted in the cache
+                pd.testing.assert_frame_equal(read_cache(store), expected, check_categorical=False)
+                result = 'same as load_postings'
+            except AssertionError as error:
+                matched = False
+                result = f"DIFFERENT: {str(error).splitlines()[0]}"
+            print(f"{name:<16}{len(paths):>4} batches {elapsed:>7.2f} s  {result}")
+    return matched
+
+
+STARTUP_SCRIPT = (
+    "import time; start = time.perf_counter(); import Dashboard_Final; "
+    "print(time.perf_counter() - start)"
+)
+
+
+# Dropdown option counts run on every filter change, so they must stay well
+# under a figure render
+FACET_BUDGET_MS = 30
+
+
+def scan_facets(engine, years, skills=None, education_levels=None, skill_subcategories=None):
+    # One filter engine selection and bincount per facet, without its own filter
+    filters = dict(skills=skills, education_levels=education_levels, skill_subcategories=skill_subcategories)
+    counts = {}
+    for facet, column in FILTER_COLUMNS.items():
+        rows = engine.select(years, **{argument: values for argument, values in filters.items() if argument != facet})
+        codes = engine.codes[column][rows]
+        counts[facet] = np.bincount(codes[codes >= 0], minlength=len(engine.categories[column]))
+    return counts
+
+
+def bench_facets(scales, repeat, budget_ms, seed=0):
+    from facets import FacetIndex
+
+    within = True
+    for scale in scales:
+        rows = int(BASE_ROWS * scale)
+        df = synthetic_postings(rows, seed=seed)
+        engine = FilterEngine(df)
+        start = time.perf_counter()
+        facets = FacetIndex(engine)
+        build = time.perf_counter() - start
+        print(f"\nscale {scale}x: {rows} rows, index built in {build:.2f} s, {facets.nbytes / 2 ** 20:.1f} MiB")
+        print(f"{'scenario':<20}{'scan p95 ms':>12}{'bitmap p50 ms':>14}{'bitmap p95 ms':>14}")
+        for scenario, filters in filter_scenarios(df).items():
+            expected = scan_facets(engine, **filters)
+            assert all((facets.counts(**filters)[facet] == counts).all() for facet, counts in expected.items()), scenario
+            samples = {'scan': [], 'bitmap': []}
+            for _ in range(repeat):
+                for name, func in (('scan', scan_facets), ('bitmap', None)):
+                    begin = time.perf_counter()
+                    if func is None:
+                        facets.counts(**filters)
+                    else:
+                        func(engine, **filters)
+                    samples[name].append(time.perf_counter() - begin)
+            scan, bitmap = percentiles(samples['scan']), percentiles(samples['bitmap'])
+            within &= bitmap['p95_ms'] <= budget_ms
+            print(f"{scenario:<20}{scan['p95_ms']:>12.2f}{bitmap['p50_ms']:>14.2f}{bitmap['p95_ms']:>14.2f}")
+    print(f"\nbudget: p95 {budget_ms:.0f} ms per interaction")
+    return within
+
+
+def parse_importtime(stderr):
+    # -X importtime lines: "import time: self [us] | cumulative | name",
+    # with the name indented two spaces per nesting level
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def bench_startup(runs, top, budget_ms):
+    root = os.path.dirname(os.path.abspath(__file__))
+    walls = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+                              capture_output=True, text=True, check=True, cwd=root)
+        walls.append(float(proc.stdout.strip().splitlines()[-1]) * 1000)
+        imports = parse_importtime(proc.stderr)
+
+    local = {os.path.splitext(name)[0] for name in os.listdir(root) if name.endswith('.py')}
+    # Direct imports of the app, and everything they pull in
+    print(f"{'imported by the app':<32}{'cumulative ms':>14}")
+    direct = sorted((i for i in imports if i[1] == 1), key=lambda i: -i[3])
+    for name, _, _, cumulative in direct[:top]:
+        print(f"{name:<32}{cumulative / 1000:>14.1f}")
+    print(f"\n{'app module':<32}{'self ms':>14}")
+    for name, _, self_us, _ in sorted((i for i in imports if i[0] in local), key=lambda i: -i[2]):
+        print(f"{name:<32}{self_us / 1000:>14.1f}")
+
+    median = float(np.median(walls))
+    print(f"\nimport Dashboard_Final: median {median:.0f} ms over {runs} runs "
+          f"({', '.join(f'{w:.0f}' for w in walls)}), budget {budget_ms:.0f} ms")
+    return median <= budget_ms
+
+
+def environment():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def compare_runs(previous, current):
+    # p95 of every (scale, tab, scenario) present in both runs
+    def index(report):
+        return {(run['scale'], r['tab'], r['scenario']): r for run in report['runs'] for r in run['results']}
+    before, after = index(previous), index(current)
+    print(f"\ncompared with {previous['environment'].get('revision')} ({previous['environment'].get('timestamp')})")
+    print(f"{'scale':>6} {'tab':<11}{'scenario':<20}{'p95 before':>11}{'p95 now':>9}{'change':>9}")
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key]['p95_ms'], after[key]['p95_ms']
+        change = (new / old - 1) * 100 if old else float('nan')
+        print(f"{key[0]:>6} {key[1]:<11}{key[2]:<20}{old:>11.2f}{new:>9.2f}{change:>+8.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command')
+    micro = subparsers.add_parser('micro', help="time the data path on the real workbook")
+    micro.add_argument('--data', default='Salary_Sub.xlsx')
+    micro.add_argument('--repeat', type=int, default=50)
+    callbacks = subparsers.add_parser('callbacks', help="drive the tab callbacks on synthetic data")
+    callbacks.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100],
+                           help="multiples of the real row count (1000 is ~16M rows)")
+    callbacks.add_argument('--repeat', type=int, default=20)
+    callbacks.add_argument('--seed', type=int, default=0)
+    callbacks.add_argument('--output', default='bench_results.json')
+    callbacks.add_argument('--compare', help="earlier results JSON to compare p95 latency against")
+    payload = subparsers.add_parser('payload', help="report figure payload sizes and encode times")
+    payload.add_argument('--scales', type=float, nargs='+', default=[1, 10])
+    payload.add_argument('--repeat', type=int, default=20)
+    payload.add_argument('--seed', type=int, default=0)
+    facets = subparsers.add_parser('facets', help="time the dropdown option counts against a budget")
+    facets.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100])
+    facets.add_argument('--repeat', type=int, default=20)
+    facets.add_argument('--seed', type=int, default=0)
+    facets.add_argument('--budget-ms', type=float, default=FACET_BUDGET_MS)
+    firstpaint = subparsers.add_parser('firstpaint', help="time the first render of every tab, cold and prewarmed")
+    firstpaint.add_argument('--scales', type=float, nargs='+', default=[1, 10])
+    firstpaint.add_argument('--repeat', type=int, default=5)
+    firstpaint.add_argument('--workers', type=int, default=4)
+    firstpaint.add_argument('--seed', type=int, default=0)
+    ingest = subparsers.add_parser('ingest', help="check incremental ingestion against the workbook cache")
+    ingest.add_argument('--data', default='Salary_Sub.xlsx')
+    ingest.add_argument('--chunk-rows', type=int, default=4000)
+    startup = subparsers.add_parser('startup', help="profile the app's cold start against a budget")
+    startup.add_argument('--runs', type=int, default=3)
+    startup.add_argument('--top', type=int, default=15)
+    startup.add_argument('--budget-ms', type=float, default=2500)
+    parser.set_defaults(command='micro', data='Salary_Sub.xlsx', repeat=50)
+    args = parser.parse_args()
+
+    if args.command == 'startup':
+        if not bench_startup(args.runs, args.top, args.budget_ms):
+            print("FAIL: cold start over budget")
+            sys.exit(1)
+        return
+
+    if args.command == 'facets':
+        if not bench_facets(args.scales, args.repeat, args.budget_ms, args.seed):
+            print("FAIL: facet counts over budget")
+            sys.exit(1)
+        return
+
+    if args.command == 'ingest':
+        if not bench_ingest(args.data, args.chunk_rows):
+            print("FAIL: ingested store differs from the workbook cache")
+            sys.exit(1)
+        return
+
+    if args.command == 'firstpaint':
+        bench_firstpaint(args.scales, args.repeat, args.workers, args.seed)
+        return
+
+    if args.command == 'payload':
+        bench_payloads(args.scales, args.repeat, args.seed)
+        return
+
+    if args.command == 'callbacks':
+        report = {'environment': environment(), 'runs': bench_callbacks(args.scales, args.repeat, args.seed)}
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nresults written to {args.output}")
+        if args.compare:
+            with open(args.compare) as f:
+                compare_runs(json.load(f), report)
+        return
+
+    df = load_postings(args.data)
+    print(f"{len(df)} postings from {args.data}\n")
+    bench_filters(df, args.repeat)
+    bench_counts(df, args.repeat)
+    bench_salary(df, args.repeat)
+    bench_top_k(df, args.repeat)
+    bench_skill_search(df, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Server-side box plot statistics for the salary chart.
+
+px.box ships every salary point to the browser and lets plotly.js compute
+the boxes, so the Salary tab's payload grows with the number of postings.
+box_summary computes the same statistics in NumPy, for all education levels
+at once, so the figure only carries a handful of numbers per box plus a
+capped sample of outliers.
+
+The statistics follow plotly.js defaults: quartiles use linear
+interpolation (quartilemethod='linear'), whiskers end at the most extreme
+points within 1.5 IQR of the box, and anything beyond them is an outlier.
+"""
+import numpy as np
+
+# Outliers kept per box; the extremes are always included
+MAX_OUTLIERS = 100
+
+# Quantiles reported per box: the box itself plus the P10/P90 readouts
+QUANTILES = {'p10': 0.1, 'q1': 0.25, 'median': 0.5, 'q3': 0.75, 'p90': 0.9}
+
+
+def quantiles(sorted_values, starts, sizes, q):
+    # Linear-interpolated quantile q of every group of a group-sorted array
+    position = q * (sizes - 1)
+    low = np.floor(position).astype(np.intp)
+    high = np.minimum(low + 1, sizes - 1)
+    fraction = position - low
+    below = sorted_values[starts + low]
+    return below + (sorted_values[starts + high] - below) * fraction
+
+
+def sample_outliers(values, limit):
+    # Evenly spaced picks from sorted outliers, keeping both ends
+    if len(values) <= limit:
+        return values
+    return values[np.linspace(0, len(values) - 1, limit).round().astype(np.intp)]
+
+
+def empty_summary():
+    empty = np.empty(0)
+    summary = {name: empty for name in QUANTILES}
+    summary.update(group=np.empty(0, dtype=np.intp), count=np.empty(0, dtype=np.intp), lowerfence=empty,
+                   upperfence=empty, mean=empty, outliers=[])
+    return summary
+
+
+def box_summary(groups, values, max_outliers=MAX_OUTLIERS):
+    """Box statistics of `values` per integer group code.
+
+    Missing values are ignored. Returns a dict of per-box arrays (group,
+    count, p10, q1, median, q3, p90, lowerfence, upperfence, mean) plus
+    'outliers', a list with one capped, sorted outlier array per box. Boxes
+    are ordered by group code and only groups with at least one value are
+    present.
+    """
+    keep = ~np.isnan(values)
+    groups = groups[keep]
+    values = values[keep]
+    if not len(values):
+        return empty_summary()
+
+    order = np.lexsort((values, groups))
+    groups = groups[order]
+    values = values[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    return sorted_summary(groups[starts], values, starts, max_outliers)
+
+
+def sorted_summary(groups, values, starts, max_outliers=MAX_OUTLIERS):
+    # box_summary of values already sorted within each box; box i holds
+    # values[starts[i]:starts[i + 1]] and has group code groups[i]
+    if not len(values):
+        return empty_summary()
+    sizes = np.diff(np.r_[starts, len(values)])
+    stats = {name: quantiles(values, starts, sizes, q) for name, q in QUANTILES.items()}
+    q1 = stats['q1']
+    q3 = stats['q3']
+    iqr = q3 - q1
+
+    # Per-row bounds of each row's box, then the extreme in-bound values
+    box_of_row = np.repeat(np.arange(len(starts)), sizes)
+    low_bound = (q1 - 1.5 * iqr)[box_of_row]
+    high_bound = (q3 + 1.5 * iqr)[box_of_row]
+    inside = (values >= low_bound) & (values <= high_bound)
+    lowerfence = np.minimum.reduceat(np.where(inside, values, np.inf), starts)
+    upperfence = np.maximum.reduceat(np.where(inside, values, -np.inf), starts)
+
+    outliers = [
+        sample_outliers(box_values[~box_inside], max_outliers)
+        for box_values, box_inside in zip(np.split(values, starts[1:]), np.split(inside, starts[1:]))
+    ]
+    stats.update(
+        group=groups,
+        count=sizes,
+        lowerfence=lowerfence,
+        upperfence=upperfence,
+        mean=np.add.reduceat(values, starts) / sizes,
+        outliers=outliers,
+    )
+    return stats
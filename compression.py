@@ -0,0 +1,80 @@
+"""gzip / brotli compression of the app's responses.
+
+Callback responses are JSON (figures are mostly text: trace names, layout
+and the plotly_white template) and compress to a fraction of their size.
+register(server) adds an after_request hook that compresses text responses
+above MIN_BYTES with brotli when the client accepts it and the brotli
+module is installed, and with gzip otherwise. Streamed responses and
+responses that already carry a Content-Encoding are left alone.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies are not worth the CPU or the extra header bytes
+MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/javascript',
+    'text/plain',
+)
+
+
+def accepted_encodings(header):
+    # Codings with a non-zero q-value in an Accept-Encoding header
+    encodings = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            encodings.add(coding.lower())
+    return encodings
+
+
+def choose_encoding(header):
+    encodings = accepted_encodings(header or '')
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def register(server, min_bytes=MIN_BYTES):
+    """Compress eligible responses of a Flask server."""
+    from flask import request
+
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None or (response.content_length or 0) < min_bytes:
+            return response
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is a different representation of the same entity
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    server.after_request(compress_response)
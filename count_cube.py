@@ -0,0 +1,115 @@
+"""Pre-aggregated posting counts for the count charts.
+
+The education bar, the degree trend line and the city bar only ever count
+postings. At load time the postings are collapsed into a sparse cube: one
+cell per distinct (year, education, skill, subcategory, city) combination
+that occurs, with its posting count. A chart query filters the cells with
+the same predicate the filter engine applies to rows and sums the matching
+counts, so its cost depends on the number of occupied cells, not on the
+number of postings.
+
+When the data is so fine-grained that the cube would be nearly as large as
+the postings themselves, CountCube.build returns None and callers fall back
+to FilterEngine.count_by, which scans the rows. A cube can also be built
+over a subset of the dimensions (always including year); dropping the
+high-cardinality city dimension gives a much smaller rollup that still
+answers the education and degree charts. Year is always the first
+dimension, so the cells come out year-sorted and a year range is a slice of
+them, as for the rows.
+"""
+import math
+
+import numpy as np
+
+from filter_engine import group_counts, offset_table, select_sorted
+
+DIMENSIONS = ('year', 'min_edulevels_name', 'skill_name', 'skill_subcategory_name', 'city_name')
+
+# The cube is skipped above this many cells, or when it would hold more
+# than this fraction of the row count
+MAX_CELLS = 2_000_000
+MAX_RATIO = 0.5
+
+
+def aggregate(keys, sizes, weights=None):
+    # Distinct combinations of dense integer keys in key order, with their
+    # row counts (or summed weights)
+    if math.prod(sizes) < np.iinfo(np.int64).max:
+        flat = np.ravel_multi_index(keys, sizes)
+        cells, inverse = np.unique(flat, return_inverse=True)
+        cell_keys = np.unravel_index(cells, sizes)
+    else:
+        cell_keys, inverse = np.unique(np.column_stack(keys), axis=0, return_inverse=True)
+        cell_keys = cell_keys.T
+    counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(cell_keys[0]))
+    return cell_keys, counts.astype(np.int64)
+
+
+class CountCube:
+    def __init__(self, engine, coords, sizes, counts):
+        self.engine = engine
+        self.coords = coords
+        self.sizes = sizes
+        self.counts = counts
+        # Cells are year-sorted, so they get the same offset table as rows
+        self.year_values, self.year_offsets = offset_table(coords['year'].astype(np.int64) + engine.year_min)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def build(cls, engine, dimensions=DIMENSIONS, max_cells=MAX_CELLS, max_ratio=MAX_RATIO):
+        """Aggregate the engine's rows, or return None if the cube is too large."""
+        columns = tuple(dimensions)
+        if columns[0] != 'year':
+            raise ValueError("The first cube dimension must be 'year'")
+        dimensions = [engine.dimension(column) for column in columns]
+        keys = [codes for codes, _ in dimensions]
+        sizes = [size for _, size in dimensions]
+        cell_keys, counts = aggregate(keys, sizes)
+        return cls.from_cells(engine, columns, cell_keys, sizes, counts, max_cells, max_ratio)
+
+    @classmethod
+    def from_cells(cls, engine, columns, cell_keys, sizes, counts, max_cells=MAX_CELLS, max_ratio=MAX_RATIO):
+        if len(counts) > max_cells or len(counts) > max_ratio * len(engine):
+            return None
+        coords = {
+            column: codes.astype(np.min_scalar_type(size))
+            for column, codes, size in zip(columns, cell_keys, sizes)
+        }
+        return cls(engine, coords, dict(zip(columns, sizes)), counts)
+
+    def extend(self, engine, max_cells=MAX_CELLS, max_ratio=MAX_RATIO):
+        """Cube for `engine`, an extension of this cube's engine (see
+        FilterEngine.extend); only the appended rows are aggregated and merged
+        into the existing cells. Returns None if the cube grows too large."""
+        start = len(self.engine)
+        columns = tuple(self.sizes)
+        keys = []
+        sizes = []
+        for column in columns:
+            new_codes, size = engine.dimension(column, slice(start, None))
+            codes = self.coords[column].astype(np.intp)
+            if column != 'year' and size != self.sizes[column]:
+                # New categories move the missing-value slot to the new end
+                codes[codes == self.sizes[column] - 1] = size - 1
+            keys.append(np.concatenate([codes, new_codes]))
+            sizes.append(size)
+        weights = np.concatenate([self.counts, np.ones(len(engine) - start, dtype=np.int64)])
+        cell_keys, counts = aggregate(keys, sizes, weights)
+        return self.from_cells(engine, columns, cell_keys, sizes, counts, max_cells, max_ratio)
+
+    def select(self, years, skills=None, education_levels=None, skill_subcategories=None):
+        tables = self.engine.tables(skills, education_levels, skill_subcategories)
+        return select_sorted(self.year_values, self.year_offsets, self.coords, years, tables)
+
+    def count_by(self, columns, years, skills=None, education_levels=None, skill_subcategories=None):
+        """Posting counts per group of `columns`, summed from the matching cells."""
+        return self.count_rows(columns, self.select(years, skills, education_levels, skill_subcategories))
+
+    def count_rows(self, columns, cells):
+        # Group counts of an already selected set of cells
+        sizes = [self.sizes[column] for column in columns]
+        keys, counts = group_counts([self.coords[column][cells] for column in columns], sizes,
+                                    weights=self.counts[cells])
+        return self.engine.count_table(columns, keys, sizes, counts)
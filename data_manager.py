@@ -0,0 +1,114 @@
+"""Hot reloading of the postings without restarting workers.
+
+DataManager owns the current Dataset. A reload (triggered by the file
+watcher or explicitly) loads the workbook through the columnar cache and
+builds the new Dataset with all its indexes in a background thread, then
+swaps it in with a single reference assignment. Callbacks take
+manager.dataset once per request, so requests already in progress finish on
+the snapshot they started with while new ones see the new data.
+
+Each gunicorn worker runs its own manager; the first one to notice a change
+builds the columnar cache and the others pick it up (or race to write the
+same files, which write_cache tolerates). A manager can also follow an
+appendable store written by ingest.py (loader=read_cache, path=the store
+directory, whose modification time changes with each new manifest); appended
+batches then extend the current indexes rather than rebuilding them.
+"""
+import logging
+import os
+import threading
+
+from data_store import load_postings
+from dataset import Dataset
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path):
+    # Cheap change detection; the cache key itself still uses the content hash
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class DataManager:
+    def __init__(self, path, loader=load_postings):
+        self.path = path
+        self.loader = loader
+        self.signature = file_signature(path)
+        self.dataset = Dataset(loader(path))
+        self.reloads = 0
+        self.failures = 0
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def on_swap(self, listener):
+        """Call listener(dataset) after every swap."""
+        self.listeners.append(listener)
+
+    def swap(self, dataset):
+        # A plain attribute assignment: readers see either the old or the new
+        # Dataset, never a mix
+        self.dataset = dataset
+        for listener in self.listeners:
+            listener(dataset)
+
+    def reload(self, wait=False):
+        """Rebuild the dataset in the background; returns False if one is running."""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+            self.thread = threading.Thread(target=self._reload, name='dataset-reload', daemon=True)
+            self.thread.start()
+            thread = self.thread
+        if wait:
+            thread.join()
+        return True
+
+    def _reload(self):
+        signature = file_signature(self.path)
+        try:
+            df = self.loader(self.path)
+            if df.attrs.get('version') == self.dataset.version:
+                self.signature = signature
+                return
+            dataset = self.dataset.refresh(df)
+        except Exception:
+            self.failures += 1
+            logger.exception("Reloading %s failed; keeping version %s", self.path, self.dataset.version)
+            return
+        self.signature = signature
+        if dataset.version != self.dataset.version:
+            self.swap(dataset)
+            self.reloads += 1
+            logger.info("Reloaded %s: %d postings, version %s", self.path, len(dataset), dataset.version)
+
+    def check(self):
+        """Start a reload if the source file changed since the last load."""
+        signature = file_signature(self.path)
+        if signature is not None and signature != self.signature:
+            return self.reload()
+        return False
+
+    def watch(self, interval):
+        """Poll the source file every `interval` seconds in a daemon thread."""
+        def poll():
+            while not stop.wait(interval):
+                try:
+                    self.check()
+                except Exception:
+                    logger.exception("Checking %s for changes failed", self.path)
+
+        stop = threading.Event()
+        threading.Thread(target=poll, name='dataset-watch', daemon=True).start()
+        return stop
+
+    def stats(self):
+        return {
+            'rows': len(self.dataset),
+            'reloads': self.reloads,
+            'failures': self.failures,
+        }
@@ -0,0 +1,178 @@
+"""Columnar on-disk cache for the postings workbook.
+
+Parsing Salary_Sub.xlsx with openpyxl is by far the slowest part of starting
+the dashboard, and every gunicorn worker used to repeat it. The workbook is
+now converted once into a directory of raw column files plus a JSON manifest:
+
+    <cache dir>/<workbook stem>-v<format>-<sha256 prefix>-<mtime_ns>/
+        manifest.json
+        year.bin, salary.bin, ...          numeric columns
+        skill_name.bin, city_name.bin, ... integer codes of string columns
+
+String columns are dictionary-encoded (the categories live in the manifest),
+so every column is a fixed-width array that can be memory-mapped. Workers
+open the same files read-only, start in milliseconds and share the physical
+pages through the OS page cache instead of each holding a private copy.
+
+Rows are stored sorted by year, so filters can turn a year range into a
+contiguous slice of every column.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_FORMAT = 2
+CACHE_DIR = os.environ.get(
+    'DASHBOARD_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data_cache')
+)
+MANIFEST = 'manifest.json'
+
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+
+def source_key(path):
+    # Content hash plus modification time: touching or replacing the
+    # workbook always yields a new cache directory
+    return f"{content_hash(path)}-{os.stat(path).st_mtime_ns}"
+
+
+def cache_path(path, cache_dir=None):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir or CACHE_DIR, f"{stem}-v{CACHE_FORMAT}-{source_key(path)}")
+
+
+def code_dtype(n_categories):
+    # Same width pandas picks for Categorical codes, so building the
+    # Categorical from the memory-mapped codes does not cast (and copy) them
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def encode_column(series):
+    # Returns (array, manifest entry) for one DataFrame column
+    if series.dtype.kind in 'biuf':
+        values = np.ascontiguousarray(series.to_numpy())
+        return values, {'name': series.name, 'kind': 'numeric', 'dtype': values.dtype.str}
+
+    # Strings (and mixed object columns, stored by their string form)
+    values = series.where(series.isna(), series.astype(str))
+    codes, categories = pd.factorize(values, sort=True)
+    dtype = code_dtype(len(categories))
+    entry = {
+        'name': series.name,
+        'kind': 'category',
+        'dtype': dtype.str,
+        'categories': [str(c) for c in categories],
+    }
+    return codes.astype(dtype), entry
+
+
+def write_cache(df, target, source=None):
+    # Write into a private temp directory and rename it into place, so
+    # concurrent workers never observe a half-written cache
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix='.building-', dir=parent)
+    try:
+        columns = []
+        for name in df.columns:
+            values, entry = encode_column(df[name])
+            values.tofile(os.path.join(tmp, f"{name}.bin"))
+            columns.append(entry)
+        manifest = {
+            'format': CACHE_FORMAT,
+            'source': source,
+            'rows': len(df),
+            'columns': columns,
+        }
+        with open(os.path.join(tmp, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another worker finished the same cache first
+            if not os.path.exists(os.path.join(target, MANIFEST)):
+                raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def column_file(entry):
+    # Appendable stores (ingest.py) rename a column's file when rewriting it
+    return entry.get('file', f"{entry['name']}.bin")
+
+
+def read_cache(target, retries=3):
+    for attempt in range(retries):
+        with open(os.path.join(target, MANIFEST)) as f:
+            manifest = json.load(f)
+        try:
+            return read_columns(target, manifest)
+        except FileNotFoundError:
+            # A store rewrite replaced the manifest and removed the files it
+            # listed while they were being opened; read the new one
+            if attempt == retries - 1:
+                raise
+
+
+def read_columns(target, manifest):
+    if manifest.get('format') != CACHE_FORMAT:
+        raise ValueError(f"Unsupported cache format in {target}")
+
+    rows = manifest['rows']
+    data = {}
+    for entry in manifest['columns']:
+        dtype = np.dtype(entry['dtype'])
+        if rows:
+            values = np.memmap(os.path.join(target, column_file(entry)),
+                               dtype=dtype, mode='r', shape=(rows,))
+            values = np.asarray(values)
+        else:
+            values = np.empty(0, dtype=dtype)
+        if entry['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, categories=entry['categories'], validate=False)
+        data[entry['name']] = values
+    df = pd.DataFrame(data, copy=False)
+    # Identifies this exact version of the source data (hash and mtime, or
+    # the store's own version after appends)
+    df.attrs['version'] = manifest.get('version', os.path.basename(target))
+    df.attrs['cache_path'] = target
+    # Stores only append rows within an epoch, so a later read with the same
+    # epoch starts with the same rows
+    if 'epoch' in manifest:
+        df.attrs['epoch'] = f"{manifest['store_id']}-{manifest['epoch']}"
+    return df
+
+
+def prune_cache(path, keep, cache_dir=None):
+    # Drop caches built from older versions of the same workbook
+    root = cache_dir or CACHE_DIR
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for name in os.listdir(root):
+        full = os.path.join(root, name)
+        if full != keep and name.startswith(f"{stem}-") and os.path.isdir(full):
+            shutil.rmtree(full, ignore_errors=True)
+
+
+def load_postings(path, cache_dir=None):
+    """Load the postings workbook through the columnar cache."""
+    target = cache_path(path, cache_dir)
+    if not os.path.exists(os.path.join(target, MANIFEST)):
+        df = pd.read_excel(path).sort_values('year', kind='stable', ignore_index=True)
+        write_cache(df, target, source=os.path.basename(path))
+        prune_cache(path, target, cache_dir)
+    return read_cache(target)
@@ -0,0 +1,96 @@
+"""One version of the postings together with the indexes derived from it.
+
+The callbacks never touch module-level frames directly: they take the
+current Dataset once at the start of a request and use only that object, so
+everything a figure is built from (rows, codes, count cubes) belongs to the
+same version of the data.
+"""
+import copy
+
+from count_cube import DIMENSIONS, CountCube
+from facets import FacetIndex
+from filter_engine import FilterEngine
+from metadata import DatasetMetadata
+from quantile_index import SalaryIndex
+from skill_search import SkillIndex
+from top_k import CityTopK
+
+
+class Dataset:
+    def __init__(self, df, version=None):
+        # The year slider, marks and default filters need at least one year
+        if not len(df):
+            raise ValueError("No postings to serve: the data has no rows")
+        self.engine = FilterEngine(df)
+        # The engine keeps the rows year-sorted; use its frame from here on
+        self.df = self.engine.df
+        self.version = version if version is not None else df.attrs.get('version')
+
+        # Pre-aggregated counts for the count charts. City is high-cardinality,
+        # so the education and degree charts get a rollup without it; each
+        # falls back to scanning rows when its cube would not be much smaller
+        # than the data
+        full_cube = CountCube.build(self.engine)
+        rollup_cube = full_cube if full_cube is not None else CountCube.build(self.engine, DIMENSIONS[:-1])
+        self.city_counter = full_cube if full_cube is not None else self.engine
+        self.trend_counter = rollup_cube if rollup_cube is not None else self.engine
+        # Top cities for the geographic chart
+        self.city_top_k = CityTopK(self.engine, self.city_counter)
+
+        self.salary_values = self.df['salary'].to_numpy(dtype=float)
+        # Salaries pre-sorted per (education, year) for the salary boxes
+        self.salary_index = SalaryIndex(self.engine, self.salary_values)
+
+        # Skill dropdown search, ranked by posting count
+        self.skill_index = SkillIndex.from_engine(self.engine)
+        # Option counts for the filter dropdowns
+        self.facets = FacetIndex(self.engine)
+
+        # Dropdown options and year bounds for the layout
+        self.metadata = DatasetMetadata.load_or_build(self.engine, self.version, df.attrs.get('cache_path'))
+
+    def __len__(self):
+        return len(self.engine)
+
+    def refresh(self, df):
+        """Dataset for a newer version of the postings.
+
+        When `df` comes from the same epoch of an appendable store (ingest.py)
+        it starts with this dataset's rows, and the indexes are extended with
+        the appended rows instead of being rebuilt."""
+        epoch = df.attrs.get('epoch')
+        if epoch is None or epoch != self.df.attrs.get('epoch') or len(df) < len(self):
+            return Dataset(df)
+        engine = self.engine.extend(df)
+        if engine is None:
+            return Dataset(df)
+
+        dataset = copy.copy(self)
+        dataset.engine = engine
+        dataset.df = engine.df
+        dataset.version = df.attrs.get('version')
+        dataset.city_counter = extend_counter(self.city_counter, engine)
+        if self.trend_counter is self.city_counter:
+            dataset.trend_counter = dataset.city_counter
+        else:
+            dataset.trend_counter = extend_counter(self.trend_counter, engine)
+        dataset.city_top_k = self.city_top_k.extend(engine, dataset.city_counter)
+        dataset.salary_values = dataset.df['salary'].to_numpy(dtype=float)
+        # Sorting within partitions is cheap next to the other indexes, so
+        # the salary index is rebuilt
+        dataset.salary_index = SalaryIndex(engine, dataset.salary_values)
+        dataset.skill_index = SkillIndex.from_engine(engine)
+        dataset.facets = FacetIndex(engine)
+        dataset.metadata = DatasetMetadata.from_engine(engine, dataset.version)
+        if df.attrs.get('cache_path'):
+            dataset.metadata.save(df.attrs['cache_path'])
+        return dataset
+
+
+def extend_counter(counter, engine):
+    # A cube that grows too large falls back to scanning rows, as in __init__
+    if isinstance(counter, CountCube):
+        cube = counter.extend(engine)
+        if cube is not None:
+            return cube
+    return engine
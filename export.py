@@ -0,0 +1,144 @@
+"""Streaming export of the postings behind a chart.
+
+GET /export takes the tabs' filters as query parameters and streams the
+matching rows as CSV (the default) or Parquet:
+
+    /export?years=2015&years=2020&skills=Python&skills=SQL&format=csv
+
+years (two values, default the full range), skills, education_levels and
+skill_subcategories (repeated, any of) filter like the tab dropdowns do.
+The filter engine selects the rows (a slice or an array of positions) and
+the response is generated EXPORT_CHUNK_ROWS rows at a time: each chunk is
+taken from the frame, encoded and sent before the next one is read, so the
+filtered frame is never built and the first bytes leave right away. Parquet
+gets one row group per chunk and needs pyarrow.
+"""
+EXPORT_CHUNK_ROWS = 50_000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+LIST_FILTERS = ('skills', 'education_levels', 'skill_subcategories')
+
+
+def parse_filters(args, metadata):
+    """Filter arguments of FilterEngine.select from request query parameters."""
+    years = args.getlist('years')
+    if not years:
+        years = metadata.year_range
+    elif len(years) != 2:
+        raise ValueError("years takes two values, e.g. years=2015&years=2020")
+    try:
+        years = [int(year) for year in years]
+    except ValueError:
+        raise ValueError("years must be integers") from None
+    if years[0] > years[1]:
+        raise ValueError("years must be in ascending order, e.g. years=2015&years=2020")
+    filters = {'years': years}
+    for name in LIST_FILTERS:
+        filters[name] = args.getlist(name) or None
+    return filters
+
+
+def row_chunks(rows, chunk_rows):
+    # Slices or position arrays of at most chunk_rows of a selection
+    if isinstance(rows, slice):
+        for start in range(rows.start, rows.stop, chunk_rows):
+            yield slice(start, min(start + chunk_rows, rows.stop))
+    else:
+        for start in range(0, len(rows), chunk_rows):
+            yield rows[start:start + chunk_rows]
+
+
+def frame_chunks(df, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    for chunk in row_chunks(rows, chunk_rows):
+        yield df.iloc[chunk] if isinstance(chunk, slice) else df.take(chunk)
+
+
+def csv_stream(df, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    header = True
+    for chunk in frame_chunks(df, rows, chunk_rows):
+        yield chunk.to_csv(index=False, header=header).encode()
+        header = False
+    if header:
+        yield df.iloc[:0].to_csv(index=False).encode()
+
+
+class ChunkSink:
+    # Write-only file object whose bytes are handed out as they arrive
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_stream(df, rows, chunk_rows=EXPORT_CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = ChunkSink()
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in frame_chunks(df, rows, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+STREAMS = {
+    'csv': csv_stream,
+    'parquet': parquet_stream,
+}
+
+
+def register(server, get_dataset, path='/export', chunk_rows=EXPORT_CHUNK_ROWS):
+    """Serve streamed exports of the current dataset's filtered rows."""
+    from flask import Response, request
+
+    def export():
+        data = get_dataset()
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            return {'error': f"format must be one of {', '.join(FORMATS)}"}, 400
+        if fmt == 'parquet':
+            try:
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                return {'error': "Parquet export requires pyarrow"}, 501
+        try:
+            filters = parse_filters(request.args, data.metadata)
+        except ValueError as error:
+            return {'error': str(error)}, 400
+        rows = data.engine.select(**filters)
+        count = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+        # The generator holds on to this dataset, so a reload mid-export
+        # does not change the rows being sent
+        response = Response(STREAMS[fmt](data.engine.df, rows, chunk_rows), mimetype=FORMATS[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="postings.{fmt}"'
+        response.headers['X-Export-Rows'] = str(int(count))
+        return response
+
+    server.add_url_rule(path, 'export', export)
@@ -0,0 +1,182 @@
+"""Posting counts for the options of every filter dropdown.
+
+Each dropdown lists how many postings its options would leave given the
+tab's other filters (the year range and the other two dropdowns, but not
+its own selection), and hides options that would leave none.
+
+The counts come from one BitmapIndex per dropdown column, over the
+year-sorted rows of the filter engine. Frequent values (at least
+1 / DENSE_FRACTION of the rows) keep a packed bitset, the rest a sorted
+array of row ids, as roaring bitmaps do, so the index takes a few bytes per
+row; columns with at most BITSET_VALUES values (education levels,
+subcategories) keep a bitset for every value. A selection is the union of
+its values' rows, built as a packed bitset over the bytes of the year range
+only, and the selections of several dropdowns are intersected with a
+bitwise AND. A facet over an all-bitset column is then one AND and
+popcount per value. Other facets count their column's codes over the
+selected rows, or subtract the counts of the unselected rows from the
+year range's counts when most rows are selected. Facets with no other
+active dropdown read a per-year count table instead of touching rows.
+
+`python benchmark.py facets` checks the counts against a row scan and
+holds them to a latency budget.
+"""
+import numpy as np
+
+from filter_engine import FILTER_COLUMNS
+
+# Values on at least 1 / DENSE_FRACTION of the rows are stored as bitsets,
+# as are all values of columns with at most BITSET_VALUES of them
+DENSE_FRACTION = 16
+BITSET_VALUES = 32
+
+# Bit masks of the rows of one byte, most significant bit first (packbits order)
+ROW_BITS = (128 >> np.arange(8)).astype(np.uint8)
+
+
+def popcount(bits):
+    # Set bits of a packed bitset; np.bitwise_count needs NumPy 2.0
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(bits).sum())
+    return int(np.count_nonzero(np.unpackbits(bits)))
+
+
+class BitmapIndex:
+    """Rows of each value of one encoded column."""
+
+    def __init__(self, codes, n_values, dense_fraction=DENSE_FRACTION, bitset_values=BITSET_VALUES):
+        self.n_rows = len(codes)
+        counts = np.bincount(codes[codes >= 0], minlength=n_values)
+        dense = counts * dense_fraction >= max(self.n_rows, 1)
+        # Every value as a bitset: facet counts are popcounts
+        self.complete = n_values <= bitset_values
+        if self.complete:
+            dense[:] = True
+        self.bitsets = {int(code): np.packbits(codes == code) for code in np.flatnonzero(dense)}
+        # Row ids of the other values, grouped by value and ascending
+        sparse = np.ones(n_values, dtype=bool)
+        sparse[list(self.bitsets)] = False
+        rows = np.flatnonzero(sparse[codes] & (codes >= 0)) if n_values else np.empty(0, dtype=np.intp)
+        rows = rows[np.argsort(codes[rows], kind='stable')]
+        self.row_ids = rows.astype(np.int32 if self.n_rows < 2 ** 31 else np.int64)
+        self.offsets = np.r_[0, np.cumsum(np.where(sparse, counts, 0))]
+
+    @property
+    def nbytes(self):
+        return sum(bits.nbytes for bits in self.bitsets.values()) + self.row_ids.nbytes + self.offsets.nbytes
+
+    def union(self, codes, start, stop):
+        """Packed bitset of the rows in [start, stop) with any of the codes,
+        covering bytes start // 8 to ceil(stop / 8)."""
+        first, end = start >> 3, (stop + 7) >> 3
+        bits = np.zeros(end - first, dtype=np.uint8)
+        sparse = []
+        for code in np.unique(codes):
+            code = int(code)
+            if code in self.bitsets:
+                bits |= self.bitsets[code][first:end]
+                continue
+            ids = self.row_ids[self.offsets[code]:self.offsets[code + 1]]
+            sparse.append(ids[np.searchsorted(ids, start):np.searchsorted(ids, stop)])
+        if len(bits):
+            # Bitsets cover whole bytes: clear the rows outside the range
+            bits[0] &= 0xff >> (start & 7)
+            if stop & 7:
+                bits[-1] &= (0xff << (8 - (stop & 7))) & 0xff
+        if sparse:
+            ids = np.concatenate(sparse) - (first << 3)
+            np.bitwise_or.at(bits, ids >> 3, ROW_BITS[ids & 7])
+        return bits
+
+    def popcounts(self, bits, start):
+        # Selected rows per value, for a selection built by union
+        first = start >> 3
+        counts = np.zeros(len(self.offsets) - 1, dtype=np.int64)
+        for code, bitset in self.bitsets.items():
+            counts[code] = popcount(bits & bitset[first:first + len(bits)])
+        return counts
+
+
+class FacetIndex:
+    def __init__(self, engine):
+        self.engine = engine
+        self.bitmaps = {}
+        self.year_counts = {}
+        n_years = len(engine.year_values)
+        year_slot = np.repeat(np.arange(n_years), np.diff(engine.year_offsets))
+        for column in FILTER_COLUMNS.values():
+            codes = engine.codes[column]
+            n_values = len(engine.categories[column])
+            self.bitmaps[column] = BitmapIndex(codes, n_values)
+            # Cumulative counts per value up to each year, for unfiltered facets
+            present = codes >= 0
+            table = np.bincount(year_slot[present] * n_values + codes[present],
+                                minlength=n_years * n_values).reshape(n_years, n_values)
+            self.year_counts[column] = np.vstack([np.zeros((1, n_values), dtype=np.int64),
+                                                  np.cumsum(table, axis=0)])
+
+    @property
+    def nbytes(self):
+        return sum(bitmap.nbytes for bitmap in self.bitmaps.values()) + sum(
+            table.nbytes for table in self.year_counts.values())
+
+    def counts(self, years, skills=None, education_levels=None, skill_subcategories=None,
+               facets=tuple(FILTER_COLUMNS)):
+        """Posting counts per code of each facet's column (facets are filter
+        arguments), given the year range and the other active dropdowns."""
+        engine = self.engine
+        first = np.searchsorted(engine.year_values, years[0], side='left')
+        last = np.searchsorted(engine.year_values, years[1], side='right')
+        start, stop = int(engine.year_offsets[first]), int(engine.year_offsets[last])
+        selections = {
+            'skills': skills,
+            'education_levels': education_levels,
+            'skill_subcategories': skill_subcategories,
+        }
+        active = {argument: values for argument, values in selections.items() if values}
+        unions = {}
+        rows = {}
+        result = {}
+        for facet in facets:
+            column = FILTER_COLUMNS[facet]
+            others = tuple(argument for argument in active if argument != facet)
+            if not others:
+                table = self.year_counts[column]
+                result[facet] = table[last] - table[first]
+                continue
+            if others not in rows:
+                bits = None
+                for argument in others:
+                    if argument not in unions:
+                        other = FILTER_COLUMNS[argument]
+                        unions[argument] = self.bitmaps[other].union(
+                            engine.resolve(other, active[argument]), start, stop)
+                    bits = unions[argument] if bits is None else bits & unions[argument]
+                rows[others] = bits
+            bits = rows[others]
+            bitmap = self.bitmaps[column]
+            if bitmap.complete:
+                result[facet] = bitmap.popcounts(bits, start)
+                continue
+            # Count whichever of the selected and unselected rows are fewer
+            selected = np.unpackbits(bits).view(bool)[start & 7:(start & 7) + stop - start]
+            fewer = np.count_nonzero(selected) * 2 <= len(selected)
+            codes = engine.codes[column][np.flatnonzero(selected if fewer else ~selected) + start]
+            counts = np.bincount(codes[codes >= 0].astype(np.intp), minlength=len(engine.categories[column]))
+            if not fewer:
+                table = self.year_counts[column]
+                counts = table[last] - table[first] - counts
+            result[facet] = counts
+        return result
+
+    def options(self, facet, counts, selected=None):
+        """Dropdown options of a facet in value order, labelled with their
+        counts; options without postings are left out unless selected."""
+        column = FILTER_COLUMNS[facet]
+        categories = self.engine.categories[column]
+        selected = set(selected or [])
+        return [
+            {'label': f"{value} ({counts[code]:,})", 'value': value}
+            for value, code in sorted((str(value), code) for code, value in enumerate(categories)
+                                      if counts[code] or str(value) in selected)
+        ]
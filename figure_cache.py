@@ -0,0 +1,186 @@
+"""Bounded LRU cache for the tab figures.
+
+Most visitors look at the default filters, so the same figures were being
+rebuilt on every page load. FigureCache stores each figure's JSON under a
+canonical key of (tab, dataset version, filters): dropdown selections are
+sorted, None and [] mean the same thing, and years are plain ints, so
+equivalent filter states share one entry.
+
+The in-memory tier evicts least recently used entries once the stored JSON
+exceeds max_bytes. An optional directory tier (one file per entry) is shared
+by all gunicorn workers on the host. Keys include the version of the dataset
+the figure was built from, so a refreshed workbook never serves stale
+figures. set_version drops the memory tier; files of old versions are never
+read again and age out of the disk tier through its byte budget.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from metrics import STAGE_SECONDS
+
+# Figures are serialized with orjson when it is installed (NumPy arrays go
+# out as base64 typed arrays either way); Dash picks the same engine for
+# its responses
+JSON_ENGINE = 'orjson' if orjson is not None else 'json'
+loads = orjson.loads if orjson is not None else json.loads
+
+# Rebuilding the file index of the disk tier on every write would be
+# wasteful, so it is pruned every this many writes
+DISK_PRUNE_EVERY = 64
+
+
+def canonical_filters(years=None, skills=None, education_levels=None, skill_subcategories=None):
+    return {
+        'years': [int(y) for y in years] if years else None,
+        'skills': sorted(skills or []),
+        'education_levels': sorted(education_levels or []),
+        'skill_subcategories': sorted(skill_subcategories or []),
+    }
+
+
+class FigureCache:
+    def __init__(self, max_bytes=64 << 20, disk_dir=None, max_disk_bytes=256 << 20, version=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.version = version
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_writes = 0
+        self.lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def key(self, tab, version, filters):
+        payload = json.dumps([tab, version, canonical_filters(**filters)], sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def set_version(self, version):
+        # A new dataset invalidates everything cached for the old one
+        with self.lock:
+            if version == self.version:
+                return
+            self.version = version
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def contains(self, key):
+        # Whether either tier holds the key, without counting a hit or miss
+        with self.lock:
+            if key in self.entries:
+                return True
+        return bool(self.disk_dir) and os.path.exists(os.path.join(self.disk_dir, f"{key}.json"))
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+        value = self.read_disk(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self.remember(key, value)
+        return value
+
+    def put(self, key, value):
+        self.remember(key, value)
+        self.write_disk(key, value)
+
+    def remember(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            if len(value) > self.max_bytes:
+                return
+            self.entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(os.path.join(self.disk_dir, f"{key}.json")) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = os.path.join(self.disk_dir, f"{key}.json")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                f.write(value)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self.lock:
+            self.disk_writes += 1
+            prune = self.disk_writes % DISK_PRUNE_EVERY == 0
+        if prune:
+            self.prune_disk()
+
+    def prune_disk(self):
+        # Drop the least recently written files beyond the disk budget
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def figure(self, tab, version, filters, build):
+        """Cached figure JSON for a tab's filters on one dataset version,
+        building it on a miss."""
+        key = self.key(tab, version, filters)
+        value = self.get(key)
+        if value is None:
+            figure = build()
+            with STAGE_SECONDS.time(tab, 'serialize'):
+                value = figure.to_json(validate=False, engine=JSON_ENGINE)
+            self.put(key, value)
+        return loads(value)
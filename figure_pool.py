@@ -0,0 +1,107 @@
+"""Building several tab figures at once on a worker pool.
+
+The tab callbacks render one figure each, but a fresh dataset leaves every
+tab cold: the first visit to each tab pays for its aggregation and for the
+plotly figure construction and serialization, which is most of a render.
+FigurePool.build takes a list of (tab, filters) requests, fans them out
+and returns the figure JSON of each, in order; the app uses it to prewarm
+the default view of all four tabs into the figure cache whenever a dataset
+is loaded, so the first paint of every tab is a cache hit.
+
+DASHBOARD_FIGURE_POOL picks the pool:
+
+- 'thread' (default): threads share the Dataset object itself. NumPy and
+  the JSON encoder release the GIL for part of a render; plotly's Python
+  code does not.
+- 'process': worker processes, started with spawn (forking a threaded
+  server is unsafe), each open the columnar cache the dataset was read
+  from (data_store.read_cache), so the columns are shared memory-mapped
+  pages rather than copies, and only build the indexes. This scales the
+  plotly work with the cores. Datasets that do not come from the cache, or
+  whose cache has moved on to a newer version or been removed, are built
+  in-process.
+- 'serial': no pool.
+
+DASHBOARD_FIGURE_WORKERS sets the pool size (default: up to 4, one per
+core).
+"""
+import os
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from figure_cache import JSON_ENGINE
+
+POOL = os.environ.get('DASHBOARD_FIGURE_POOL', 'thread')
+WORKERS = int(os.environ.get('DASHBOARD_FIGURE_WORKERS', 0)) or min(4, os.cpu_count() or 1)
+
+
+class StaleDataset(Exception):
+    """The worker's cache holds a different version than the one requested."""
+
+
+def build_json(data, tab, filters):
+    # Plotting modules are imported on the first render, not at startup
+    import figures
+    return figures.RENDERERS[tab](data, filters).to_json(validate=False, engine=JSON_ENGINE)
+
+
+# Dataset of a process worker, loaded from the columnar cache on first use
+_worker_dataset = None
+
+
+def build_in_worker(cache_path, version, tab, filters):
+    global _worker_dataset
+    if _worker_dataset is None or _worker_dataset.version != version:
+        from data_store import read_cache
+        from dataset import Dataset
+
+        _worker_dataset = Dataset(read_cache(cache_path))
+        if _worker_dataset.version != version:
+            raise StaleDataset(f"{cache_path} holds {_worker_dataset.version}, not {version}")
+    return build_json(_worker_dataset, tab, filters)
+
+
+class FigurePool:
+    def __init__(self, kind=POOL, workers=WORKERS):
+        if kind not in ('thread', 'process', 'serial'):
+            raise ValueError(f"Unknown figure pool {kind!r}; expected thread, process or serial")
+        self.kind = kind
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def pool(self):
+        # Started on first use, so importing the app spawns nothing
+        with self.lock:
+            if self.executor is None:
+                if self.kind == 'process':
+                    import multiprocessing
+                    self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='figures')
+            return self.executor
+
+    def build(self, data, requests):
+        """Figure JSON for each (tab, filters) request on one dataset, in order."""
+        if self.kind == 'serial' or self.workers < 2 or len(requests) < 2:
+            return [build_json(data, tab, filters) for tab, filters in requests]
+        cache_path = data.df.attrs.get('cache_path')
+        if self.kind == 'process' and cache_path:
+            futures = [self.pool().submit(build_in_worker, cache_path, data.version, tab, filters)
+                       for tab, filters in requests]
+        else:
+            futures = [self.pool().submit(build_json, data, tab, filters) for tab, filters in requests]
+        results = []
+        for (tab, filters), future in zip(requests, futures):
+            try:
+                results.append(future.result())
+            except (StaleDataset, BrokenExecutor, OSError):
+                # OSError: the cache directory was pruned after a reload
+                results.append(build_json(data, tab, filters))
+        return results
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
@@ -0,0 +1,105 @@
+"""Chart layouts built once, with only the traces built per request.
+
+Drawing a chart with plotly.express validated every argument, built a
+figure object trace by trace and resolved the plotly_white template and
+the dashboard styling into the layout again on every render, which cost
+more than the aggregation on small selections. A FigureTemplate resolves
+its chart's layout (template, fonts, colors, axis titles) into a plain
+dict when figures.py is imported; a render only builds the trace dicts,
+with NumPy arrays encoded as base64 typed arrays as plotly does.
+
+The layout is also most of a figure's JSON (the resolved template alone is
+about 7 KB), and it does not change between renders. The app keeps the
+name of the template a graph shows in a small store next to it, so when
+the graph already shows a figure of the same template, patch() answers
+with a Dash Patch that only replaces the traces and the few layout values
+that vary (`varying`), and the client keeps the rest.
+"""
+import base64
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+from dash import Patch
+
+from figure_cache import orjson
+
+STYLE = dict(
+    template='plotly_white',
+    font=dict(family="Inter, sans-serif", size=14),
+    showlegend=False,
+    plot_bgcolor='white',
+    paper_bgcolor='white',
+)
+
+
+def typed_array(values):
+    # A plotly.js typed array spec, narrowing 64-bit integers like plotly
+    values = np.asarray(values)
+    if values.dtype.kind not in 'iuf' or not values.size:
+        return values.tolist()
+    if values.dtype.itemsize == 8 and values.dtype.kind in 'iu':
+        low, high = values.min(), values.max()
+        dtype = next((t for t in (np.int8, np.int16, np.int32)
+                      if np.iinfo(t).min <= low and high <= np.iinfo(t).max), np.float64)
+        values = values.astype(dtype)
+    values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+    spec = {'dtype': values.dtype.str[1:], 'bdata': base64.b64encode(values.tobytes()).decode()}
+    if values.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in values.shape)
+    return spec
+
+
+def plain(value):
+    # NumPy scalars for the json engine
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class TemplateFigure(dict):
+    """A figure as a plain dict; to_json matches go.Figure.to_json, so the
+    figure cache and pool serialize either."""
+
+    def to_json(self, validate=False, engine=None):
+        if engine == 'orjson' or (engine is None and orjson is not None):
+            return orjson.dumps(self, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        return json.dumps(self, separators=(',', ':'), default=plain)
+
+
+class FigureTemplate:
+    def __init__(self, name, varying=(), **layout):
+        self.name = name
+        # Paths of the layout values that change between renders
+        self.varying = [tuple(path.split('.')) for path in varying]
+        self.layout = go.Figure(layout={**STYLE, **layout}).to_dict()['layout']
+
+    def figure(self, traces, values=None):
+        """Figure of the traces, with the varying layout values by path
+        ({'xaxis.categoryarray': [...]})."""
+        layout = dict(self.layout)
+        for path, value in (values or {}).items():
+            *parents, leaf = path.split('.')
+            node = layout
+            for key in parents:
+                node[key] = node = dict(node.get(key, {}))
+            node[leaf] = value
+        return TemplateFigure(data=traces, layout=layout)
+
+    def patch(self, figure, drawn):
+        """A Patch turning the graph into figure when it shows a figure of
+        this template (drawn is the template name it was drawn with), else
+        figure itself."""
+        if drawn != self.name:
+            return figure
+        patch = Patch()
+        patch['data'] = figure['data']
+        for path in self.varying:
+            value = figure['layout']
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            target = patch['layout']
+            for key in path[:-1]:
+                target = target[key]
+            target[path[-1]] = value
+        return patch
@@ -0,0 +1,266 @@
+"""Figures for the four dashboard tabs.
+
+Plotting is imported from here rather than at app startup: the layouts of
+the four charts are resolved once, when this module is first imported
+(figure_templates.py), and each render only builds the trace dicts.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from plotly.colors import sequential
+
+from box_stats import box_summary
+from figure_templates import FigureTemplate, typed_array
+from metrics import FILTERED_ROWS, STAGE_SECONDS
+
+# Salary selections with at most this many points are drawn from the raw
+# values; larger ones ship precomputed box statistics instead
+RAW_SALARY_POINTS = int(os.environ.get('DASHBOARD_RAW_SALARY_POINTS', 2000))
+
+VIRIDIS = sequential.Viridis
+DEGREE_COLORS = ['#440154', '#3b528b', '#21918c', '#5ec962', '#b8de29', '#fde725']
+
+# Plot 1: Education Requirements by Skill
+EDUCATION_TEMPLATE = FigureTemplate(
+    'education',
+    varying=['xaxis.categoryarray'],
+    title=dict(text="Education Requirements by Skill", font=dict(size=20)),
+    xaxis=dict(title="Minimum Education Level", categoryorder='array'),
+    yaxis=dict(title="Number of Job Listings"),
+    barmode='relative'
+)
+
+# Plot 2: Degree Trend Over Time
+DEGREE_TEMPLATE = FigureTemplate(
+    'degree',
+    title="Degree Requirements Over Time",
+    xaxis=dict(title="Year"),
+    yaxis=dict(title="Number of Job Listings"),
+    showlegend=True,
+    legend=dict(title=dict(text='min_edulevels_name'), tracegroupgap=0)
+)
+
+# Plot 3: Salary Distribution by Education Level
+SALARY_TEMPLATE = FigureTemplate(
+    'salary',
+    varying=['title.text', 'xaxis.categoryarray'],
+    title="Salary Distribution by Education",
+    xaxis=dict(title="Minimum Education Level", categoryorder='array'),
+    yaxis=dict(title="Salary (USD)"),
+    boxmode='overlay'
+)
+
+# Plot 4: Education Level by City
+CITY_TEMPLATE = FigureTemplate(
+    'city',
+    varying=['title.text', 'xaxis.categoryarray'],
+    title="Education Level by Top Cities",
+    xaxis=dict(title="City - Minimum Education Level", categoryorder='array'),
+    yaxis=dict(title="Number of Job Listings"),
+    barmode='relative'
+)
+
+TEMPLATES = {
+    'education': EDUCATION_TEMPLATE,
+    'degree': DEGREE_TEMPLATE,
+    'salary': SALARY_TEMPLATE,
+    'city': CITY_TEMPLATE,
+}
+
+
+def compact_values(values):
+    # Plotly sends NumPy arrays as base64 typed arrays and narrows integer
+    # ones. Salaries are whole dollars, so as integers they take 4 bytes
+    # (about 5 base64 characters) a value instead of 8 as float64
+    values = np.asarray(values, dtype=float)
+    if len(values) and (values == np.round(values)).all() and np.abs(values).max() < np.iinfo(np.int32).max:
+        return values.astype(np.int32)
+    return values
+
+
+def bar_traces(column, labels, counts, errors=None):
+    # One bar trace per label, colored in order, as px.bar(x=column,
+    # color=column) draws them; errors are upper error bars
+    traces = []
+    for i, (label, count) in enumerate(zip(labels, counts)):
+        trace = dict(
+            type='bar',
+            name=label,
+            legendgroup=label,
+            x=[label],
+            y=[int(count)],
+            marker=dict(color=VIRIDIS[i % len(VIRIDIS)], pattern=dict(shape='')),
+            orientation='v',
+            textposition='auto',
+            hovertemplate=f"{column}=%{{x}}<br>count=%{{y}}<extra></extra>"
+        )
+        if errors is not None:
+            trace['error_y'] = dict(array=[int(errors[i])], arrayminus=[0])
+        traces.append(trace)
+    return traces
+
+
+def build_education_figure(skill_edu_counts):
+    labels = [str(label) for label in skill_edu_counts['min_edulevels_name']]
+    traces = bar_traces('min_edulevels_name', labels, skill_edu_counts['count'].to_numpy())
+    return EDUCATION_TEMPLATE.figure(traces, {'xaxis.categoryarray': labels})
+
+
+def build_degree_figure(edu_trend):
+    # One line per education level, in order of first appearance
+    levels = edu_trend['min_edulevels_name'].to_numpy()
+    years = edu_trend['year'].to_numpy()
+    counts = edu_trend['count'].to_numpy()
+    traces = []
+    for i, level in enumerate(pd.unique(levels)):
+        rows = levels == level
+        traces.append(dict(
+            type='scatter',
+            mode='lines',
+            name=str(level),
+            legendgroup=str(level),
+            x=typed_array(years[rows]),
+            y=typed_array(counts[rows]),
+            line=dict(color=DEGREE_COLORS[i % len(DEGREE_COLORS)], dash='solid'),
+            marker=dict(symbol='circle'),
+            orientation='v',
+            showlegend=True,
+            hovertemplate=f"min_edulevels_name={level}<br>year=%{{x}}<br>count=%{{y}}<extra></extra>"
+        ))
+    return DEGREE_TEMPLATE.figure(traces)
+
+
+def build_salary_figure(education_levels, summary, points=None):
+    # Salary boxes per education level from the box summary or, for small
+    # selections, from the (education code, salary) points
+    education_levels = np.asarray(education_levels)
+    labels = [str(label) for label in education_levels[summary['group']]]
+    if points is not None:
+        # Small selections: ship the raw points and let plotly.js draw the boxes
+        education_codes, salaries = points
+        salaries = compact_values(salaries)
+        traces = [
+            dict(
+                type='box',
+                name=label,
+                legendgroup=label,
+                offsetgroup=label,
+                alignmentgroup='True',
+                # Placed by x0 rather than an x label repeated for every point
+                x0=label,
+                y=typed_array(salaries[education_codes == group]),
+                marker=dict(color=VIRIDIS[i % len(VIRIDIS)]),
+                notched=False,
+                orientation='v',
+                hovertemplate="min_edulevels_name=%{x}<br>salary=%{y}<extra></extra>"
+            )
+            for i, (group, label) in enumerate(zip(summary['group'], labels))
+        ]
+    else:
+        # Large selections: precomputed boxes, so the payload stays constant.
+        # The outliers go out as a 1 x n typed array; the single statistics
+        # are shorter as plain numbers
+        traces = [
+            dict(
+                type='box',
+                name=label,
+                x=[label],
+                q1=[float(summary['q1'][i])],
+                median=[float(summary['median'][i])],
+                q3=[float(summary['q3'][i])],
+                lowerfence=[float(summary['lowerfence'][i])],
+                upperfence=[float(summary['upperfence'][i])],
+                mean=[float(summary['mean'][i])],
+                y=typed_array(compact_values(summary['outliers'][i])[np.newaxis]),
+                boxpoints='outliers',
+                marker=dict(color=VIRIDIS[i % len(VIRIDIS)]),
+                offsetgroup=label,
+                alignmentgroup='True'
+            )
+            for i, label in enumerate(labels)
+        ]
+    # P10 / P90 readouts next to each box
+    for name in ('p10', 'p90'):
+        traces.append(dict(
+            type='scatter',
+            x=labels,
+            y=typed_array(summary[name]),
+            mode='markers',
+            name=name.upper(),
+            marker=dict(symbol='line-ew-open', size=28, color='#6c757d', line=dict(width=2)),
+            hovertemplate=f"{name.upper()}: %{{y:$,.0f}}<extra>%{{x}}</extra>"
+        ))
+    approximate = points is None and summary.get('approximate')
+    return SALARY_TEMPLATE.figure(traces, {
+        'title.text': "Salary Distribution by Education" + (" (approximate quartiles)" if approximate else ""),
+        'xaxis.categoryarray': labels,
+    })
+
+
+def build_city_figure(city_edu_counts):
+    # Top cities, in city order. Counts from the approximate summary get
+    # error bars up to their upper bound
+    approximate = bool(city_edu_counts['error'].any())
+    labels = [str(label) for label in city_edu_counts['city_name']]
+    traces = bar_traces('city_name', labels, city_edu_counts['count'].to_numpy(),
+                        city_edu_counts['error'].to_numpy() if approximate else None)
+    return CITY_TEMPLATE.figure(traces, {
+        'title.text': "Education Level by Top Cities" + (" (approximate)" if approximate else ""),
+        'xaxis.categoryarray': labels,
+    })
+
+
+def count_figure(tab, counter, columns, filters, build_figure):
+    # Filter, aggregate and draw one of the count charts, timing each stage
+    with STAGE_SECONDS.time(tab, 'filter'):
+        rows = counter.select(**filters)
+    with STAGE_SECONDS.time(tab, 'aggregate'):
+        counts = counter.count_rows(columns, rows)
+    FILTERED_ROWS.observe(int(counts['count'].sum()), tab)
+    with STAGE_SECONDS.time(tab, 'figure'):
+        return build_figure(counts)
+
+
+def city_figure(data, filters):
+    with STAGE_SECONDS.time('city', 'aggregate'):
+        top = data.city_top_k.top(**filters)
+    FILTERED_ROWS.observe(int(top['count'].sum()), 'city')
+    with STAGE_SECONDS.time('city', 'figure'):
+        return build_city_figure(top)
+
+
+def salary_figure(data, filters):
+    engine = data.engine
+    index = data.salary_index
+    # The salary index covers the year range and education dropdown; skill
+    # and subcategory filters need the matching rows
+    indexed = not (filters.get('skills') or filters.get('skill_subcategories'))
+    with STAGE_SECONDS.time('salary', 'filter'):
+        if indexed:
+            selection = index.partitions(filters['years'], filters.get('education_levels'))
+        else:
+            rows = engine.select(**filters)
+            education_codes = engine.codes['min_edulevels_name'][rows]
+            salaries = data.salary_values[rows]
+            keep = (education_codes >= 0) & ~np.isnan(salaries)
+            education_codes, salaries = education_codes[keep], salaries[keep]
+    with STAGE_SECONDS.time('salary', 'aggregate'):
+        summary = index.summary(selection) if indexed else box_summary(education_codes, salaries)
+    FILTERED_ROWS.observe(int(summary['count'].sum()), 'salary')
+    points = None
+    if summary['count'].sum() <= RAW_SALARY_POINTS:
+        points = index.points(selection) if indexed else (education_codes, salaries)
+    with STAGE_SECONDS.time('salary', 'figure'):
+        return build_salary_figure(engine.categories['min_edulevels_name'], summary, points)
+
+
+# Tab name -> function drawing that tab's figure from a Dataset and filters
+RENDERERS = {
+    'education': lambda data, filters: count_figure(
+        'education', data.trend_counter, ['min_edulevels_name'], filters, build_education_figure),
+    'degree': lambda data, filters: count_figure(
+        'degree', data.trend_counter, ['year', 'min_edulevels_name'], filters, build_degree_figure),
+    'salary': salary_figure,
+    'city': city_figure,
+}
@@ -0,0 +1,218 @@
+"""Dictionary-encoded filter engine for the dashboard tabs.
+
+Every tab filters the postings by a year range and by three multi-select
+dropdowns. Instead of chaining Series.isin calls on string columns (each one
+copying the frame), the engine keeps the integer codes of the categorical
+columns, turns a dropdown selection into a boolean lookup table over the
+codes, and evaluates the whole predicate as one NumPy mask. Only the final
+row selection is materialized.
+
+Rows are kept sorted by year, with a table of where each year starts, so a
+year range is a contiguous slice found by binary search. The dropdown masks
+are only evaluated inside that slice, and a selection without dropdown
+filters stays a zero-copy slice (the full range is the whole frame).
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+# Dropdown filters: keyword argument -> encoded column
+FILTER_COLUMNS = {
+    'skills': 'skill_name',
+    'education_levels': 'min_edulevels_name',
+    'skill_subcategories': 'skill_subcategory_name',
+}
+# Other categorical columns the charts aggregate on
+ENCODED_COLUMNS = tuple(FILTER_COLUMNS.values()) + ('city_name',)
+
+
+def group_counts(keys, sizes, weights=None):
+    # Count (or sum `weights`) per distinct combination of dense integer keys.
+    # Returns the non-empty combinations in key order and their counts.
+    if not keys[0].size:
+        return [np.empty(0, dtype=np.intp) for _ in keys], np.empty(0, dtype=np.int64)
+    flat = np.ravel_multi_index(keys, sizes)
+    totals = np.bincount(flat, weights=weights, minlength=int(np.prod(sizes)))
+    cells = np.flatnonzero(totals)
+    return list(np.unravel_index(cells, sizes)), totals[cells].astype(np.int64)
+
+
+def offset_table(year):
+    # Distinct years of a year-sorted array and the offset where each one
+    # starts, plus a final entry for the end
+    if not len(year):
+        return year[:0], np.zeros(1, dtype=np.intp)
+    starts = np.r_[0, np.flatnonzero(np.diff(year)) + 1]
+    return year[starts], np.r_[starts, len(year)]
+
+
+def select_sorted(year_values, year_offsets, codes, years, tables):
+    # Rows of a year-sorted set matching the year range and code tables: a
+    # slice when no tables apply, otherwise an array of positions
+    start = year_offsets[np.searchsorted(year_values, years[0], side='left')]
+    stop = year_offsets[np.searchsorted(year_values, years[1], side='right')]
+    if not tables:
+        return slice(int(start), int(stop))
+    mask = None
+    for column, table in tables.items():
+        matches = table[codes[column][start:stop]]
+        mask = matches if mask is None else mask & matches
+    return np.flatnonzero(mask) + start
+
+
+def encode(series):
+    # Categorical codes are used as-is (for the memory-mapped cache they are
+    # shared, not copied); anything else is factorized once here
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.array.codes, series.cat.categories
+    codes, categories = pd.factorize(series, sort=True)
+    return codes, categories
+
+
+class FilterEngine:
+    def __init__(self, df):
+        year = df['year'].to_numpy()
+        if (year[1:] < year[:-1]).any():
+            # The columnar cache is already year-sorted; anything else is
+            # sorted once here
+            df = df.take(np.argsort(year, kind='stable'))
+            year = df['year'].to_numpy()
+        self.df = df
+        self.year = year
+        self.year_values, self.year_offsets = offset_table(year)
+        self.year_min = int(self.year.min()) if len(self.year) else 0
+        self.year_codes = (self.year - self.year_min).astype(np.int32)
+        self.codes = {}
+        self.categories = {}
+        self.lookup = {}
+        self.has_missing = {}
+        for column in ENCODED_COLUMNS:
+            codes, categories = encode(df[column])
+            self.codes[column] = codes
+            self.has_missing[column] = bool((codes < 0).any())
+            self.categories[column] = categories
+            self.lookup[column] = {value: code for code, value in enumerate(categories)}
+
+    def __len__(self):
+        return len(self.year)
+
+    def extend(self, df):
+        """Engine for `df`, whose first len(self) rows are this engine's rows.
+
+        Only the appended rows are scanned. Returns None when they are not
+        year-sorted after the existing rows or their categories do not extend
+        the existing ones, in which case the engine has to be rebuilt."""
+        start = len(self)
+        year = df['year'].to_numpy()
+        tail = year[start:]
+        if not start or (len(tail) and (tail[0] < year[start - 1] or (tail[1:] < tail[:-1]).any())):
+            return None
+        engine = copy.copy(self)
+        engine.df = df
+        engine.year = year
+
+        # Offsets of the new rows continue the table; a year that was already
+        # last keeps its start
+        values, offsets = offset_table(tail)
+        if len(values) and values[0] == self.year_values[-1]:
+            values, offsets = values[1:], offsets[1:]
+        engine.year_values = np.concatenate([self.year_values, values])
+        engine.year_offsets = np.concatenate([self.year_offsets[:-1], offsets + start])
+        engine.year_codes = np.concatenate([self.year_codes, (tail - self.year_min).astype(np.int32)])
+
+        engine.codes = {}
+        engine.categories = {}
+        engine.lookup = {}
+        engine.has_missing = {}
+        for column in ENCODED_COLUMNS:
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                return None
+            codes, categories = encode(df[column])
+            known = self.categories[column]
+            if not categories[:len(known)].equals(known):
+                return None
+            engine.codes[column] = codes
+            engine.categories[column] = categories
+            engine.has_missing[column] = self.has_missing[column] or bool((codes[start:] < 0).any())
+            lookup = engine.lookup[column] = dict(self.lookup[column])
+            for code in range(len(known), len(categories)):
+                lookup[categories[code]] = code
+        return engine
+
+    def resolve(self, column, values):
+        # Dropdown values -> code array; values absent from the data match nothing
+        lookup = self.lookup[column]
+        return np.array([lookup[v] for v in values if v in lookup], dtype=np.intp)
+
+    def code_table(self, column, values):
+        # One extra slot at the end so missing values (code -1) never match
+        table = np.zeros(len(self.categories[column]) + 1, dtype=bool)
+        table[self.resolve(column, values)] = True
+        return table
+
+    def tables(self, skills=None, education_levels=None, skill_subcategories=None):
+        # Code lookup tables for the active dropdowns only
+        selections = {
+            'skills': skills,
+            'education_levels': education_levels,
+            'skill_subcategories': skill_subcategories,
+        }
+        return {
+            FILTER_COLUMNS[argument]: self.code_table(FILTER_COLUMNS[argument], values)
+            for argument, values in selections.items() if values
+        }
+
+    def select(self, years, skills=None, education_levels=None, skill_subcategories=None):
+        """Rows matching the filters: a slice or an array of positions."""
+        tables = self.tables(skills, education_levels, skill_subcategories)
+        return select_sorted(self.year_values, self.year_offsets, self.codes, years, tables)
+
+    def filter(self, years, skills=None, education_levels=None, skill_subcategories=None):
+        """Filtered frame, materialized once from the row selection."""
+        rows = self.select(years, skills, education_levels, skill_subcategories)
+        if isinstance(rows, slice):
+            if rows.start == 0 and rows.stop == len(self):
+                return self.df
+            return self.df.iloc[rows]
+        return self.df.take(rows)
+
+    def dimension(self, column, rows=slice(None)):
+        # Dense codes (of `rows`) and cardinality of a groupable column;
+        # missing values get the code one past the last category
+        if column == 'year':
+            size = int(self.year_values[-1]) - self.year_min + 1 if len(self.year_values) else 1
+            return self.year_codes[rows], size
+        codes = self.codes[column][rows]
+        size = len(self.categories[column]) + 1
+        if self.has_missing[column]:
+            codes = np.where(codes < 0, size - 1, codes)
+        return codes, size
+
+    def labels(self, column, codes):
+        # Dense codes back to the values shown on the charts
+        if column == 'year':
+            return codes + self.year_min
+        return np.asarray(self.categories[column])[codes]
+
+    def count_table(self, columns, keys, sizes, counts):
+        # Assemble group keys into the frame a groupby(...).size() would give,
+        # dropping the missing-value slot like groupby does
+        keep = np.ones(len(counts), dtype=bool)
+        for column, codes, size in zip(columns, keys, sizes):
+            if column != 'year':
+                keep &= codes < size - 1
+        data = {column: self.labels(column, codes[keep]) for column, codes in zip(columns, keys)}
+        data['count'] = counts[keep]
+        return pd.DataFrame(data)
+
+    def count_by(self, columns, years, skills=None, education_levels=None, skill_subcategories=None):
+        """Posting counts per group of `columns`, by scanning the matching rows."""
+        return self.count_rows(columns, self.select(years, skills, education_levels, skill_subcategories))
+
+    def count_rows(self, columns, rows):
+        # Group counts of an already selected set of rows
+        dimensions = [self.dimension(column) for column in columns]
+        sizes = [size for _, size in dimensions]
+        keys, counts = group_counts([codes[rows] for codes, _ in dimensions], sizes)
+        return self.count_table(columns, keys, sizes, counts)
@@ -0,0 +1,311 @@
+"""Incremental ingestion of posting batches into an appendable column store.
+
+Postings arrive as daily batch files, and re-reading one ever-growing
+workbook parses all of history on every refresh. Instead, each batch (an
+Excel workbook read with openpyxl in read-only mode, a CSV or a Parquet
+file) is streamed in chunks of CHUNK_ROWS rows and appended to a store laid
+out like the workbook cache in data_store.py: one raw file per column plus
+manifest.json, readable with read_cache.
+
+- Category dictionaries only grow: a new value gets the next code, so codes
+  already on disk never change. A column whose dictionary outgrows its code
+  width (or a numeric column that needs a wider type) is rewritten once.
+- Rows stay sorted by year. A chunk whose years are all at or after the last
+  stored year, the usual case for daily batches, is appended to the column
+  files in place. An older chunk is merged into position, which rewrites the
+  store one column at a time and starts a new epoch.
+- The manifest is replaced once a whole batch is written, so readers see
+  either none or all of a batch. Bytes past the manifest's row count, left
+  by an interrupted run, are cut off by the next append. Batches already in
+  the store (same content hash) are skipped.
+
+Memory use is bounded by the chunk size, except for merging back-dated rows,
+which holds one column at a time. Dataset.refresh extends the filter engine,
+count cubes and metadata with the appended rows instead of rebuilding them.
+
+    python ingest.py --store .data_cache/postings Salary_Sub.xlsx batches/*.csv
+
+Set DASHBOARD_DATA_STORE to the store directory to serve it from the app.
+"""
+import argparse
+import fcntl
+import json
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from data_store import (CACHE_DIR, CACHE_FORMAT, MANIFEST, code_dtype, column_file, content_hash,
+                        encode_column)
+
+CHUNK_ROWS = 50_000
+LOCK_FILE = '.lock'
+
+
+def numeric_columns(chunk, names=None):
+    # Text that parses as numbers becomes numbers, as pd.read_excel and
+    # read_csv infer them: openpyxl returns cells stored as text as str
+    for name in chunk.columns if names is None else names:
+        if chunk[name].dtype.kind not in 'biuf':
+            try:
+                chunk[name] = pd.to_numeric(chunk[name])
+            except (ValueError, TypeError):
+                pass
+    return chunk
+
+
+def excel_batches(path, chunk_rows):
+    # Read-only mode streams the sheet instead of loading it into memory
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) for name in header]
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield numeric_columns(pd.DataFrame.from_records(chunk, columns=columns))
+                chunk = []
+        if chunk:
+            yield numeric_columns(pd.DataFrame.from_records(chunk, columns=columns))
+    finally:
+        workbook.close()
+
+
+def csv_batches(path, chunk_rows):
+    with pd.read_csv(path, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def parquet_batches(path, chunk_rows):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet batches requires pyarrow") from None
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+BATCH_READERS = {
+    '.xlsx': excel_batches,
+    '.xlsm': excel_batches,
+    '.csv': csv_batches,
+    '.parquet': parquet_batches,
+}
+
+
+def read_batches(path, chunk_rows=CHUNK_ROWS):
+    """DataFrame chunks of at most chunk_rows rows from a batch file."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in BATCH_READERS:
+        raise ValueError(f"Unsupported batch file {path}; expected one of {', '.join(BATCH_READERS)}")
+    return BATCH_READERS[extension](path, chunk_rows)
+
+
+@contextmanager
+def store_lock(store):
+    # One writer at a time; readers never take the lock
+    os.makedirs(store, exist_ok=True)
+    with open(os.path.join(store, LOCK_FILE), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_manifest(store):
+    try:
+        with open(os.path.join(store, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_column(store, entry, rows):
+    return np.fromfile(os.path.join(store, column_file(entry)), dtype=np.dtype(entry['dtype']), count=rows)
+
+
+def last_value(store, entry, rows):
+    dtype = np.dtype(entry['dtype'])
+    return np.fromfile(os.path.join(store, column_file(entry)), dtype=dtype, count=1,
+                       offset=(rows - 1) * dtype.itemsize)[0]
+
+
+def write_column(store, entry, values):
+    # Rewritten columns go to a new file; the old one stays readable until
+    # the manifest that stops listing it is in place
+    entry['file'] = f"{entry['name']}-{uuid.uuid4().hex[:8]}.bin"
+    entry['dtype'] = values.dtype.str
+    values.tofile(os.path.join(store, entry['file']))
+
+
+def append_column(store, entry, rows, values):
+    with open(os.path.join(store, column_file(entry)), 'r+b') as f:
+        # Drop anything an interrupted append left past the stored rows
+        f.truncate(rows * np.dtype(entry['dtype']).itemsize)
+        f.seek(0, os.SEEK_END)
+        values.tofile(f)
+
+
+def to_category(store, entry, rows):
+    # A column read as numbers so far got text: store it by its string form,
+    # as encode_column does for mixed columns
+    values, encoded = encode_column(pd.Series(read_column(store, entry, rows), name=entry['name']).astype(str))
+    entry.update(encoded)
+    write_column(store, entry, values)
+
+
+def conform_numeric(store, entry, rows, series):
+    values = series.to_numpy()
+    if values.dtype.kind not in 'biuf':
+        if not series.isna().all():
+            to_category(store, entry, rows)
+            return conform_category(store, entry, rows, series)
+        values = np.full(len(series), np.nan)
+    stored = np.dtype(entry['dtype'])
+    wider = np.result_type(stored, values.dtype)
+    if wider != stored:
+        write_column(store, entry, read_column(store, entry, rows).astype(wider))
+    return values.astype(wider, copy=False)
+
+
+def conform_category(store, entry, rows, series):
+    # Codes against the stored dictionary, adding unseen values at the end
+    values = series.where(series.isna(), series.astype(str))
+    categories = entry['categories']
+    codes = pd.Index(categories).get_indexer(values)
+    unseen = pd.unique(values[(codes < 0) & values.notna().to_numpy()])
+    if len(unseen):
+        categories.extend(str(value) for value in unseen)
+        codes = pd.Index(categories).get_indexer(values)
+        dtype = code_dtype(len(categories))
+        if dtype != np.dtype(entry['dtype']):
+            write_column(store, entry, read_column(store, entry, rows).astype(dtype))
+    return codes.astype(np.dtype(entry['dtype']))
+
+
+def create_store(store, chunk, name):
+    manifest = {
+        'format': CACHE_FORMAT,
+        'source': name,
+        'store_id': uuid.uuid4().hex[:12],
+        'epoch': 0,
+        'rows': 0,
+        'columns': [],
+        'batches': [],
+    }
+    for column in chunk.columns:
+        values, entry = encode_column(chunk[column].iloc[:0])
+        if entry['kind'] == 'category':
+            entry['dtype'] = code_dtype(0).str
+        write_column(store, entry, values.astype(np.dtype(entry['dtype'])))
+        manifest['columns'].append(entry)
+    return manifest
+
+
+def append_chunk(store, manifest, chunk):
+    """Append one chunk to the store's column files; the manifest is updated
+    in memory and written by commit."""
+    missing = [entry['name'] for entry in manifest['columns'] if entry['name'] not in chunk.columns]
+    if missing:
+        raise ValueError(f"Batch is missing columns: {', '.join(missing)}")
+    # Columns stored as numbers take this chunk's numeric text as numbers
+    chunk = numeric_columns(chunk.copy(), [entry['name'] for entry in manifest['columns']
+                                           if entry['kind'] == 'numeric'])
+    chunk = chunk.sort_values('year', kind='stable', ignore_index=True)
+    rows = manifest['rows']
+    encoded = {}
+    for entry in manifest['columns']:
+        conform = conform_category if entry['kind'] == 'category' else conform_numeric
+        encoded[entry['name']] = conform(store, entry, rows, chunk[entry['name']])
+
+    year_entry = next(entry for entry in manifest['columns'] if entry['name'] == 'year')
+    if rows and len(chunk) and encoded['year'][0] < last_value(store, year_entry, rows):
+        # Back-dated rows: merge them into year order, one column at a time
+        positions = np.searchsorted(read_column(store, year_entry, rows), encoded['year'], side='right')
+        for entry in manifest['columns']:
+            write_column(store, entry, np.insert(read_column(store, entry, rows), positions, encoded[entry['name']]))
+        manifest['epoch'] += 1
+    else:
+        for entry in manifest['columns']:
+            append_column(store, entry, rows, encoded[entry['name']])
+    manifest['rows'] = rows + len(chunk)
+
+
+def commit(store, manifest):
+    # Atomically publish the manifest, then remove column files it no longer
+    # lists (open memory maps of them stay valid)
+    manifest['version'] = (f"{manifest['source']}-{manifest['store_id']}"
+                           f"-e{manifest['epoch']}-{manifest['rows']}")
+    fd, tmp = tempfile.mkstemp(prefix='.manifest-', dir=store)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(store, MANIFEST))
+    listed = {column_file(entry) for entry in manifest['columns']}
+    for name in os.listdir(store):
+        if name.endswith('.bin') and name not in listed:
+            try:
+                os.remove(os.path.join(store, name))
+            except OSError:
+                pass
+
+
+def ingest(store, paths, chunk_rows=CHUNK_ROWS):
+    """Append batch files to the store; returns (path, rows appended) per batch,
+    with None for batches that were already ingested."""
+    results = []
+    with store_lock(store):
+        manifest = load_manifest(store)
+        for path in paths:
+            key = content_hash(path)
+            if manifest is not None and key in {batch['key'] for batch in manifest['batches']}:
+                results.append((path, None))
+                continue
+            start = manifest['rows'] if manifest is not None else 0
+            for chunk in read_batches(path, chunk_rows):
+                if manifest is None:
+                    manifest = create_store(store, chunk, os.path.basename(os.path.normpath(store)))
+                append_chunk(store, manifest, chunk)
+            if manifest is None:
+                # Nothing to store from an empty first batch
+                results.append((path, 0))
+                continue
+            manifest['batches'].append({
+                'source': os.path.basename(path),
+                'key': key,
+                'rows': manifest['rows'] - start,
+            })
+            commit(store, manifest)
+            results.append((path, manifest['rows'] - start))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append posting batches (Excel, CSV, Parquet) to a column store.")
+    parser.add_argument('paths', nargs='+', help="batch files, appended in the given order")
+    parser.add_argument('--store', default=os.path.join(CACHE_DIR, 'postings'),
+                        help="store directory (default: %(default)s)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS,
+                        help="rows read and appended at a time (default: %(default)s)")
+    args = parser.parse_args()
+
+    for path, rows in ingest(args.store, args.paths, args.chunk_rows):
+        print(f"{path}: {'already ingested' if rows is None else f'{rows} rows appended'}")
+    manifest = load_manifest(args.store)
+    if manifest is not None:
+        print(f"{args.store}: {manifest['rows']} rows, version {manifest['version']}")
+
+
+if __name__ == '__main__':
+    main()
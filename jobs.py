@@ -0,0 +1,115 @@
+"""Running the tab callbacks without piling up superseded work.
+
+Dragging a year slider or editing a dropdown fires a burst of callbacks for
+the same graph, and only the last one's figure is ever shown: the Dash
+renderer discards responses to requests it has already re-sent. Two modes
+keep the stale ones from occupying the workers:
+
+- Single-flight (default). Each page load gets a session id, and every
+  (session, tab) key runs at most one render at a time. A request that
+  arrives while its key is busy waits, and is dropped (PreventUpdate, so
+  nothing is sent) as soon as a newer request for the same key arrives.
+  A burst therefore costs the render in progress plus the last request.
+- Background callbacks. With DASHBOARD_BACKGROUND_CALLBACKS=1 and the
+  diskcache package installed, the tab callbacks run as Dash background
+  callbacks on a DiskcacheManager: jobs run in local worker processes,
+  their state and results live in a diskcache directory
+  (DASHBOARD_JOB_CACHE_DIR) and no broker is involved. The renderer sends
+  the id of a job it no longer waits for along with the next request, and
+  the manager terminates it. Background jobs are forked from the worker, so
+  their figure cache entries only outlive the job through the disk tier
+  (DASHBOARD_FIGURE_CACHE_DIR), and their callback timings are recorded in
+  the job process and never reach /metrics.
+
+The single-flight state lives in the worker process: requests of one
+session that gunicorn routes to different workers do not see each other.
+
+Either way the graphs sit in dcc.Loading, which shows a spinner over the
+current figure while its callback is pending.
+"""
+import itertools
+import logging
+import os
+import threading
+
+from dash.exceptions import PreventUpdate
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = os.environ.get('DASHBOARD_BACKGROUND_CALLBACKS', '') not in ('', '0')
+JOB_CACHE_DIR = os.environ.get('DASHBOARD_JOB_CACHE_DIR',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), '.job_cache'))
+# Seconds job results are kept, and milliseconds between the renderer's polls
+JOB_EXPIRE = 600
+POLL_INTERVAL = 250
+
+
+def background_manager(enabled=BACKGROUND, cache_dir=JOB_CACHE_DIR):
+    """DiskcacheManager for the tab callbacks, or None to run them in the
+    request (single-flight)."""
+    if not enabled:
+        return None
+    if diskcache is None:
+        logger.warning("DASHBOARD_BACKGROUND_CALLBACKS needs the diskcache package; "
+                       "running callbacks in the request")
+        return None
+    from dash import DiskcacheManager
+    return DiskcacheManager(diskcache.Cache(cache_dir), expire=JOB_EXPIRE)
+
+
+def callback_options(manager):
+    # Extra app.callback arguments for the tab callbacks
+    if manager is None:
+        return {}
+    return {'background': True, 'manager': manager, 'interval': POLL_INTERVAL}
+
+
+class SingleFlight:
+    """At most one running call per key; superseded waiting calls are dropped."""
+
+    def __init__(self):
+        self.tokens = itertools.count()
+        self.latest = {}
+        self.running = set()
+        self.waiting = 0
+        self.dropped = 0
+        self.completed = 0
+        self.condition = threading.Condition()
+
+    def run(self, key, func):
+        with self.condition:
+            token = next(self.tokens)
+            self.latest[key] = token
+            # Wake older waiters for this key so they drop out now
+            self.condition.notify_all()
+            self.waiting += 1
+            while key in self.running and self.latest.get(key) == token:
+                self.condition.wait()
+            self.waiting -= 1
+            if self.latest.get(key) != token:
+                self.dropped += 1
+                raise PreventUpdate
+            self.running.add(key)
+        try:
+            return func()
+        finally:
+            with self.condition:
+                self.running.discard(key)
+                self.completed += 1
+                if self.latest.get(key) == token:
+                    del self.latest[key]
+                self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'running': len(self.running),
+                'waiting': self.waiting,
+                'completed': self.completed,
+                'dropped': self.dropped,
+            }
@@ -0,0 +1,553 @@
+"""Concurrent load test of the dashboard callbacks, with latency SLOs.
+
+    python load_test.py [--sessions 20] [--duration 30] [--think-ms 300] [--scale 1]
+    python load_test.py --url http://127.0.0.1:8000 [--pid GUNICORN_MASTER_PID]
+    python load_test.py --gunicorn-workers 4 [--gunicorn-threads 4]
+    ... --slo p95_ms=300 --slo city.p99_ms=1500 --slo min_rps=50 --output load.json
+
+Each simulated session behaves like a browser tab on the dashboard: it
+loads the layout, then repeatedly opens a tab and makes a few filter
+changes there (dragging the year slider, adding and removing skills,
+education levels and subcategories, typing a skill search, clearing the
+filters), pausing an exponentially distributed think time between actions.
+Every action sends the /_dash-update-component requests the browser would:
+a tab switch fires all four figure callbacks (the hidden tabs answer 204),
+a filter change fires the tab's figure and dropdown-options callbacks, and
+typing fires the options callback alone. Requests carry the session id and
+each graph's `-drawn` store as set by the previous response, like the
+renderer's do, so a drawn graph is answered with a Patch; they accept gzip.
+
+By default the app runs in-process (Flask test clients, one thread per
+session, optionally on synthetic postings at --scale times the workbook's
+rows), which behaves like one gthread worker. --url drives a running
+server instead, and --gunicorn-workers starts a local gunicorn
+(`Dashboard_Final:server`) for the run. RSS is sampled every half second
+for this process, or for the gunicorn workers (children of --pid).
+
+The report gives throughput, p50/p95/p99 latency per tab figure and per
+options/search callback, status counts and peak RSS per worker. Any SLO it
+exceeds is listed and the exit status is 1. SLOs are name=value pairs
+(see SLOS for the defaults); prefix a latency SLO with a tab or callback
+kind (education, degree, salary, city, options, search) to set it for that
+one only. Figure requests to hidden tabs are reported as `hidden`.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+import numpy as np
+
+from benchmark import BASE_ROWS, TABS, environment, synthetic_postings
+
+# Defaults, overridden with --slo name=value. Latencies apply to every tab
+# figure callback and to the options/search callbacks
+SLOS = {
+    'p95_ms': 500.0,
+    'p99_ms': 1500.0,
+    'error_rate': 0.01,
+    'min_rps': 0.0,
+    'rss_mb': 2048.0,
+}
+LATENCY_SLOS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+# Relative frequency of the actions a session takes on an open tab
+ACTIONS = {
+    'years': 4,
+    'add_skill': 3,
+    'search': 2,
+    'add_education': 2,
+    'add_subcategory': 1,
+    'remove': 2,
+    'clear': 1,
+}
+ACTIONS_PER_TAB = (2, 6)
+
+
+class InProcessClient:
+    def __init__(self, server):
+        self.client = server.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body, headers={'Accept-Encoding': 'gzip'})
+        data = response.get_data()
+        if response.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return response.status_code, data
+
+
+class HttpClient:
+    # One keep-alive connection per session, like a browser tab
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.base = parsed.path.rstrip('/')
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, self.base + path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server may close idle keep-alive connections
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return response.status, data
+
+
+def find_components(node, found=None):
+    # id -> props of every component with an id in a serialized layout
+    found = {} if found is None else found
+    if isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict) and isinstance(props.get('id'), str):
+            found[props['id']] = props
+        for value in node.values():
+            find_components(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            find_components(value, found)
+    return found
+
+
+def discover(client):
+    """Per-tab callbacks and filter choices, read from the app itself."""
+    status, body = client.request('GET', '/_dash-dependencies')
+    if status != 200:
+        raise RuntimeError(f"/_dash-dependencies: HTTP {status}")
+    dependencies = json.loads(body)
+    status, body = client.request('GET', '/_dash-layout')
+    if status != 200:
+        raise RuntimeError(f"/_dash-layout: HTTP {status}")
+    components = find_components(json.loads(body))
+
+    tabs = {}
+    for name, (tab_value, graph_id) in TABS.items():
+        figure = next(dep for dep in dependencies if f'{graph_id}.figure' in dep['output'])
+        skill_input = next(item['id'] for item in figure['inputs'] if item['id'].endswith('skill-filter'))
+        prefix = skill_input[:-len('skill-filter')]
+        options = next((dep for dep in dependencies if f'{prefix}skill-filter.options' in dep['output']), None)
+        slider = components[f'{prefix}year-filter']
+        choices = {
+            column: [option['value'] for option in components[f'{prefix}{column}-filter'].get('options') or []]
+            for column in ('skill', 'education', 'subcategory')
+        }
+        tabs[name] = {
+            'value': tab_value,
+            'graph': graph_id,
+            'prefix': prefix,
+            'figure': figure,
+            'options': options,
+            'years': (int(slider['min']), int(slider['max'])),
+            'choices': choices,
+        }
+    return tabs
+
+
+def callback_request(dependency, values, changed):
+    # /_dash-update-component body; values maps "id.property" to its value
+    parsed = [dict(zip(('id', 'property'), item.split('.'))) for item in dependency['output'].strip('.').split('...')]
+    return {
+        'output': dependency['output'],
+        'outputs': parsed if len(parsed) > 1 else parsed[0],
+        'inputs': [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in dependency['inputs']],
+        'state': [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in dependency['state']],
+        'changedPropIds': [changed],
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = []
+        self.lock = threading.Lock()
+
+    def add(self, kind, latency, status, size):
+        with self.lock:
+            self.samples.append((kind, latency, status, size))
+
+
+class Session(threading.Thread):
+    def __init__(self, client, tabs, recorder, deadline, think_ms, seed):
+        super().__init__(daemon=True)
+        self.client = client
+        self.tabs = tabs
+        self.recorder = recorder
+        self.deadline = deadline
+        self.think = think_ms / 1000
+        self.random = random.Random(seed)
+        self.session_id = uuid.uuid4().hex
+        self.values = {'session-id.data': self.session_id}
+        self.error = None
+
+    def post(self, kind, dependency, changed):
+        body = callback_request(dependency, self.values, changed)
+        start = time.perf_counter()
+        status, data = self.client.request('POST', '/_dash-update-component', body)
+        self.recorder.add(kind, time.perf_counter() - start, status, len(data))
+        if status == 200:
+            # Keep the returned figure and options for the next requests
+            for component, props in json.loads(data).get('response', {}).items():
+                for prop, value in props.items():
+                    self.values[f'{component}.{prop}'] = value
+
+    def filters_changed(self, name, changed):
+        tab = self.tabs[name]
+        self.post(name, tab['figure'], changed)
+        if tab['options'] is not None:
+            self.post('options', tab['options'], changed)
+
+    def open_tab(self, name):
+        # A tab switch fires every figure callback; hidden tabs answer 204
+        self.values['tabs.value'] = self.tabs[name]['value']
+        for other in self.tabs:
+            self.post(other if other == name else 'hidden', self.tabs[other]['figure'], 'tabs.value')
+
+    def choices(self, name, column):
+        # Current options of a dropdown (as the user sees them), else the initial ones
+        tab = self.tabs[name]
+        options = self.values.get(f"{tab['prefix']}{column}-filter.options")
+        if options:
+            return [option['value'] for option in options]
+        return tab['choices'][column]
+
+    def act(self, name):
+        tab = self.tabs[name]
+        prefix = tab['prefix']
+        action = self.random.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+        if action == 'years':
+            # A slider drag settles on a new range after one to three updates
+            low, high = tab['years']
+            for _ in range(self.random.randint(1, 3)):
+                start = self.random.randint(low, high)
+                self.values[f'{prefix}year-filter.value'] = [start, self.random.randint(start, high)]
+                self.filters_changed(name, f'{prefix}year-filter.value')
+        elif action == 'search':
+            # Typing a skill prefix, one request per keystroke
+            skills = self.choices(name, 'skill')
+            if not skills:
+                return
+            word = self.random.choice(skills).split()[0].lower()
+            for length in range(1, min(len(word), 4) + 1):
+                self.values[f'{prefix}skill-filter.search_value'] = word[:length]
+                if tab['options'] is not None:
+                    self.post('search', tab['options'], f'{prefix}skill-filter.search_value')
+            self.values[f'{prefix}skill-filter.search_value'] = None
+        elif action in ('add_skill', 'add_education', 'add_subcategory'):
+            column = action[len('add_'):]
+            key = f'{prefix}{column}-filter.value'
+            choices = [value for value in self.choices(name, column) if value not in (self.values.get(key) or [])]
+            if not choices:
+                return
+            self.values[key] = (self.values.get(key) or []) + [self.random.choice(choices[:20])]
+            self.filters_changed(name, key)
+        elif action == 'remove':
+            selected = [f'{prefix}{column}-filter.value' for column in ('skill', 'education', 'subcategory')
+                        if self.values.get(f'{prefix}{column}-filter.value')]
+            if not selected:
+                return
+            key = self.random.choice(selected)
+            self.values[key] = self.values[key][:-1] or None
+            self.filters_changed(name, key)
+        elif action == 'clear':
+            for column in ('skill', 'education', 'subcategory'):
+                self.values[f'{prefix}{column}-filter.value'] = None
+            self.values[f'{prefix}year-filter.value'] = list(tab['years'])
+            self.filters_changed(name, f'{prefix}skill-filter.value')
+
+    def pause(self):
+        time.sleep(min(self.random.expovariate(1 / self.think) if self.think else 0,
+                       max(self.deadline - time.monotonic(), 0)))
+
+    def run(self):
+        try:
+            start = time.perf_counter()
+            status, data = self.client.request('GET', '/_dash-layout')
+            self.recorder.add('layout', time.perf_counter() - start, status, len(data))
+            for name, tab in self.tabs.items():
+                self.values[f"{tab['prefix']}year-filter.value"] = list(tab['years'])
+            self.open_tab('education')
+            while time.monotonic() < self.deadline:
+                self.pause()
+                name = self.random.choice(list(self.tabs))
+                self.open_tab(name)
+                for _ in range(self.random.randint(*ACTIONS_PER_TAB)):
+                    if time.monotonic() >= self.deadline:
+                        break
+                    self.pause()
+                    self.act(name)
+        except Exception as error:
+            self.error = error
+
+
+def rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def worker_pids(master):
+    # Children of a gunicorn master, from /proc
+    pids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == master:
+                        pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return pids
+
+
+class RssSampler(threading.Thread):
+    # Samples the workers of a gunicorn master, this process when the app
+    # runs in-process, or nothing (a remote server without --pid)
+    def __init__(self, master=None, in_process=True, interval=0.5):
+        super().__init__(daemon=True)
+        self.master = master
+        self.in_process = in_process and not master
+        self.interval = interval
+        self.peaks = {}
+        self.stopped = threading.Event()
+
+    def sample(self):
+        if self.master:
+            pids = worker_pids(self.master)
+        else:
+            pids = [os.getpid()] if self.in_process else []
+        for pid in pids:
+            rss = rss_mb(pid)
+            if rss is not None:
+                self.peaks[pid] = max(self.peaks.get(pid, 0), rss)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.sample()
+        if self.in_process:
+            # ru_maxrss also catches peaks between samples
+            self.peaks[os.getpid()] = max(self.peaks.get(os.getpid(), 0),
+                                          resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+
+
+def start_gunicorn(workers, threads, port):
+    if shutil.which('gunicorn') is None:
+        raise SystemExit("--gunicorn-workers needs gunicorn installed")
+    root = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(['gunicorn', '-w', str(workers), '--threads', str(threads),
+                                '-b', f'127.0.0.1:{port}', 'Dashboard_Final:server'], cwd=root)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            # Workers load the dataset before they accept; give them a moment
+            time.sleep(1)
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise SystemExit("gunicorn did not start within 120 s")
+
+
+def summarize(recorder, wall, peaks):
+    samples = recorder.samples
+    kinds = {}
+    for kind, latency, status, size in samples:
+        kinds.setdefault(kind, []).append((latency, status, size))
+    report = {'callbacks': {}}
+    for kind, rows in sorted(kinds.items()):
+        latencies = np.array([latency for latency, _, _ in rows]) * 1000
+        statuses = {}
+        for _, status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        report['callbacks'][kind] = {
+            'requests': len(rows),
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+            'statuses': statuses,
+            'mean_bytes': round(float(np.mean([size for _, _, size in rows])), 1),
+        }
+    errors = sum(1 for _, _, status, _ in samples if status >= 400)
+    report['requests'] = len(samples)
+    report['wall_s'] = round(wall, 2)
+    report['rps'] = round(len(samples) / wall, 2) if wall else 0.0
+    report['error_rate'] = round(errors / len(samples), 4) if samples else 0.0
+    report['rss_mb'] = {str(pid): round(peak, 1) for pid, peak in sorted(peaks.items())}
+    return report
+
+
+def check_slos(report, slos):
+    """Descriptions of the SLOs the run exceeded."""
+    failures = []
+    for name, limit in slos.items():
+        scope, _, metric = name.rpartition('.')
+        if metric in LATENCY_SLOS:
+            for kind, stats in report['callbacks'].items():
+                if kind == 'layout' or (scope and kind != scope):
+                    continue
+                # A tab-specific SLO overrides the general one
+                if not scope and f'{kind}.{metric}' in slos:
+                    continue
+                if stats[metric] > limit:
+                    failures.append(f"{kind} {metric} {stats[metric]:.1f} > {limit:g}")
+        elif metric == 'error_rate' and report['error_rate'] > limit:
+            failures.append(f"error_rate {report['error_rate']:.4f} > {limit:g}")
+        elif metric == 'min_rps' and report['rps'] < limit:
+            failures.append(f"throughput {report['rps']:.1f} req/s < {limit:g}")
+        elif metric == 'rss_mb':
+            for pid, peak in report['rss_mb'].items():
+                if peak > limit:
+                    failures.append(f"worker {pid} RSS {peak:.0f} MB > {limit:g}")
+    return failures
+
+
+def parse_slos(pairs):
+    slos = dict(SLOS)
+    for pair in pairs:
+        name, _, value = pair.partition('=')
+        metric = name.rpartition('.')[2]
+        if metric not in SLOS and metric not in LATENCY_SLOS:
+            raise SystemExit(f"unknown SLO {name}; expected one of {', '.join(sorted(set(SLOS) | set(LATENCY_SLOS)))}")
+        slos[name] = float(value)
+    return slos
+
+
+def print_report(report, slos):
+    print(f"\n{report['requests']} requests in {report['wall_s']} s: {report['rps']} req/s, "
+          f"error rate {report['error_rate']:.2%}")
+    print(f"{'callback':<11}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>9}  statuses")
+    for kind, stats in report['callbacks'].items():
+        statuses = ' '.join(f"{status}:{count}" for status, count in sorted(stats['statuses'].items()))
+        print(f"{kind:<11}{stats['requests']:>9}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['mean_bytes']:>9.0f}  {statuses}")
+    for pid, peak in report['rss_mb'].items():
+        print(f"worker {pid}: peak RSS {peak:.0f} MB")
+    if not report['rss_mb']:
+        print("worker RSS not sampled (pass --pid with the gunicorn master pid)")
+    print("SLOs: " + ', '.join(f"{name}={value:g}" for name, value in slos.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20, help="concurrent sessions (default: %(default)s)")
+    parser.add_argument('--duration', type=float, default=30, help="seconds of load (default: %(default)s)")
+    parser.add_argument('--think-ms', type=float, default=300,
+                        help="mean pause between a session's actions (default: %(default)s)")
+    parser.add_argument('--ramp-up', type=float, default=2, help="seconds over which sessions start")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=float,
+                        help="in-process only: serve synthetic postings at this multiple of the workbook's rows")
+    parser.add_argument('--url', help="drive a running server instead of the app in-process")
+    parser.add_argument('--pid', type=int, help="gunicorn master pid, to sample its workers' RSS")
+    parser.add_argument('--gunicorn-workers', type=int, help="start a local gunicorn with this many workers")
+    parser.add_argument('--gunicorn-threads', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--slo', action='append', default=[], metavar='NAME=VALUE',
+                        help="SLO threshold, e.g. p95_ms=300, city.p99_ms=1000, min_rps=20, rss_mb=1024")
+    parser.add_argument('--output', help="write the report as JSON")
+    args = parser.parse_args()
+    slos = parse_slos(args.slo)
+
+    gunicorn = None
+    master = args.pid
+    if args.gunicorn_workers:
+        gunicorn = start_gunicorn(args.gunicorn_workers, args.gunicorn_threads, args.port)
+        args.url, master = f'http://127.0.0.1:{args.port}', gunicorn.pid
+    try:
+        if args.url:
+            make_client = lambda: HttpClient(args.url)  # noqa: E731
+        else:
+            # Imported here: loading the app pulls in Dash and the dataset
+            import Dashboard_Final as dashboard
+
+            if args.scale:
+                from dataset import Dataset
+
+                rows = int(BASE_ROWS * args.scale)
+                print(f"serving {rows} synthetic postings")
+                dashboard.data_manager.swap(Dataset(synthetic_postings(rows, seed=args.seed)))
+            make_client = lambda: InProcessClient(dashboard.server)  # noqa: E731
+
+        tabs = discover(make_client())
+        recorder = Recorder()
+        sampler = RssSampler(master, in_process=not args.url)
+        sampler.start()
+        print(f"{args.sessions} sessions for {args.duration:g} s against {args.url or 'the app in-process'}")
+        start = time.monotonic()
+        deadline = start + args.ramp_up + args.duration
+        sessions = []
+        for i in range(args.sessions):
+            session = Session(make_client(), tabs, recorder, deadline, args.think_ms, args.seed * 1000 + i)
+            session.start()
+            sessions.append(session)
+            time.sleep(args.ramp_up / max(args.sessions, 1))
+        for session in sessions:
+            session.join()
+        wall = time.monotonic() - start
+        sampler.stop()
+    finally:
+        if gunicorn is not None:
+            gunicorn.terminate()
+            gunicorn.wait()
+
+    for session in sessions:
+        if session.error is not None:
+            print(f"session {session.session_id} stopped: {session.error!r}")
+    report = summarize(recorder, wall, sampler.peaks)
+    report.update(environment=environment(), sessions=args.sessions, duration_s=args.duration,
+                  think_ms=args.think_ms, target=args.url or 'in-process', slos=slos)
+    print_report(report, slos)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.output}")
+    failures = check_slos(report, slos)
+    failed_sessions = [session for session in sessions if session.error is not None]
+    if failed_sessions:
+        failures.append(f"{len(failed_sessions)} sessions stopped on errors")
+    if failures:
+        print("FAIL: " + '; '.join(failures))
+        sys.exit(1)
+    print("all SLOs met")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Year slider bounds, computed once per dataset version.
+
+DatasetMetadata reads the year bounds of the postings from the filter
+engine and, when the postings come from the columnar cache, stores them as
+metadata.json next to the cached columns so later starts just read them
+back. The dropdown options and their counts come from the facet index
+(facets.py) and the skill search index (skill_search.py).
+"""
+import json
+import os
+import tempfile
+
+METADATA_FILE = 'metadata.json'
+
+# Years between slider marks
+MARK_STEP = 2
+
+
+class DatasetMetadata:
+    def __init__(self, version, year_min, year_max):
+        self.version = version
+        self.year_min = year_min
+        self.year_max = year_max
+
+    @classmethod
+    def from_engine(cls, engine, version=None):
+        # Dataset refuses empty data, so there is always a year
+        years = engine.year_values
+        return cls(version, int(years[0]), int(years[-1]))
+
+    @classmethod
+    def load_or_build(cls, engine, version=None, cache_dir=None):
+        """Read metadata.json from the cache directory, or compute (and store) it."""
+        if cache_dir:
+            try:
+                with open(os.path.join(cache_dir, METADATA_FILE)) as f:
+                    stored = json.load(f)
+                if stored.get('version') == version:
+                    return cls.from_dict(stored)
+            except (OSError, ValueError, KeyError):
+                pass
+        metadata = cls.from_engine(engine, version)
+        if cache_dir:
+            metadata.save(cache_dir)
+        return metadata
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['version'], data['year_min'], data['year_max'])
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'year_min': self.year_min,
+            'year_max': self.year_max,
+        }
+
+    def save(self, cache_dir):
+        # Atomic replace, as several workers may write it at the same time
+        try:
+            fd, tmp = tempfile.mkstemp(prefix='.metadata-', dir=cache_dir)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp, os.path.join(cache_dir, METADATA_FILE))
+        except OSError:
+            pass
+
+    @property
+    def year_range(self):
+        return [self.year_min, self.year_max]
+
+    @property
+    def marks(self):
+        return {year: str(year) for year in range(self.year_min, self.year_max + 1, MARK_STEP)}
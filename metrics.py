@@ -0,0 +1,174 @@
+"""Lightweight latency instrumentation with a Prometheus text endpoint.
+
+The callbacks record how long they take overall and per stage (filter,
+aggregate, figure, serialize), how many postings they matched and how large
+their figure payload is. Observations go into fixed-bucket histograms: one
+bisect and a few additions under a lock, cheap enough to leave on in
+production. register(server) exposes everything at /metrics in the
+Prometheus text format.
+
+Metrics are per process. Under gunicorn each worker reports its own
+series; scrape each worker or aggregate downstream.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Response
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+ROWS_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        # Only completed blocks are recorded; exceptions propagate untimed
+        start = time.perf_counter()
+        yield
+        self.observe(time.perf_counter() - start, *label_values)
+
+    def snapshot(self, *label_values):
+        # (cumulative bucket counts, sum, count) for one label set
+        with self.lock:
+            counts, total = self.series.get(label_values, [[0] * (len(self.buckets) + 1), 0.0])
+            counts = list(counts)
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, running
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            label_sets = sorted(self.series)
+        for label_values in label_sets:
+            cumulative, total, count = self.snapshot(*label_values)
+            for bound, value in zip(self.buckets + (float('inf'),), cumulative):
+                labels = format_labels(list(zip(self.labels, label_values)) + [('le', format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {value}")
+            labels = format_labels(list(zip(self.labels, label_values)))
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        self.collectors = []
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        histogram = Histogram(name, documentation, labels, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, name, documentation, kind, collect, label='key'):
+        # collect() returns {label value: number}, read at scrape time
+        self.collectors.append((name, documentation, kind, collect, label))
+
+    def expose(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.expose())
+        for name, documentation, kind, collect, label in self.collectors:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(collect().items()):
+                lines.append(f"{name}{format_labels([(label, key)])} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CALLBACK_SECONDS = REGISTRY.histogram(
+    'dashboard_callback_seconds', 'Wall time of a tab callback.', ['callback'])
+STAGE_SECONDS = REGISTRY.histogram(
+    'dashboard_stage_seconds', 'Wall time of one stage of a tab callback.', ['callback', 'stage'])
+RESPONSE_BYTES = REGISTRY.histogram(
+    'dashboard_response_bytes', 'Uncompressed response body of a tab callback (figure or Patch).', ['callback'],
+    buckets=BYTES_BUCKETS)
+FILTERED_ROWS = REGISTRY.histogram(
+    'dashboard_filtered_rows', 'Postings matched by the filters of a tab callback.', ['callback'],
+    buckets=ROWS_BUCKETS)
+
+
+def timed_callback(name):
+    """Record the wall time of a Dash callback; PreventUpdate is not counted."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            CALLBACK_SECONDS.observe(time.perf_counter() - start, name)
+            return result
+        return wrapper
+    return decorator
+
+
+def register(server, path='/metrics', registry=REGISTRY):
+    """Serve the registry in Prometheus text format on a Flask server."""
+    def metrics():
+        return Response(registry.expose(), content_type=CONTENT_TYPE)
+
+    server.add_url_rule(path, 'metrics', metrics)
+
+
+def register_response_bytes(server, graphs, path='/_dash-update-component'):
+    """Record the body size of the callback responses that draw a graph
+    ({graph id: callback name}), as sent: a full figure or a Patch.
+
+    Flask runs after_request hooks last registered first, so registering
+    this after compression.register measures the body before compression."""
+    from flask import request
+
+    def observe(response):
+        if request.path == path and response.status_code == 200 and not response.is_streamed:
+            body = request.get_json(silent=True) or {}
+            outputs = body.get('outputs')
+            for output in outputs if isinstance(outputs, list) else [outputs or {}]:
+                if output.get('property') == 'figure' and output.get('id') in graphs:
+                    RESPONSE_BYTES.observe(len(response.get_data()), graphs[output['id']])
+        return response
+
+    server.after_request(observe)
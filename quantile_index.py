@@ -0,0 +1,152 @@
+"""Salary quantiles per education level from pre-sorted partitions.
+
+box_summary sorts the selected salaries on every request. SalaryIndex sorts
+them once: salaries are grouped by (education level, year) partition,
+education-major, and sorted within each partition. The salaries of one
+education level over a year range are then a single contiguous slice made
+of one sorted run per year.
+
+- Exact mode merges those runs with a stable sort (timsort finds the runs
+  and only merges them, O(n log years) instead of O(n log n)) and takes the
+  statistics of the merged array, identical to box_summary.
+- Approximate mode never touches the individual salaries for the quantiles.
+  Each partition of n salaries keeps SKETCH_POINTS of them, at the middle
+  ranks of SKETCH_POINTS equal slices, each standing for n / SKETCH_POINTS
+  salaries. This misplaces at most n / (2 * SKETCH_POINTS) salaries of the
+  partition, so a quantile read off the merged sketch points of a selection
+  of N salaries is a salary whose rank is within N / (2 * SKETCH_POINTS) + 1
+  (0.4% for 128 points) of the requested position. Whiskers, outliers and
+  the mean are exact for those quartiles: they come from binary searches in
+  the sorted runs and per-partition sums.
+
+The index answers the year range and the education dropdown. Selections
+that also filter by skill or subcategory go through box_summary on the
+selected rows.
+"""
+import os
+
+import numpy as np
+
+from box_stats import MAX_OUTLIERS, QUANTILES, empty_summary, sample_outliers, sorted_summary
+
+# 'exact', 'approx' or 'auto' (approx above APPROX_SALARIES selected salaries)
+MODE = os.environ.get('DASHBOARD_SALARY_QUANTILES', 'auto')
+APPROX_SALARIES = 250_000
+SKETCH_POINTS = 128
+
+
+def sketch_quantiles(points, weights, qs):
+    # The point at position q * (N - 1) of the salaries the weighted points
+    # stand for
+    order = np.argsort(points, kind='stable')
+    points = points[order]
+    ranks = np.cumsum(weights[order])
+    positions = np.asarray(qs) * (ranks[-1] - 1)
+    return points[np.minimum(np.searchsorted(ranks, positions, side='right'), len(points) - 1)]
+
+
+class SalaryIndex:
+    def __init__(self, engine, salary_values, mode=MODE, sketch_points=SKETCH_POINTS):
+        self.engine = engine
+        self.mode = mode
+        education, education_slots = engine.dimension('min_edulevels_name')
+        self.n_education = education_slots - 1
+        self.year_min = engine.year_min
+        self.n_years = int(engine.year_values[-1]) - engine.year_min + 1 if len(engine.year_values) else 0
+
+        keep = ~np.isnan(salary_values)
+        partition = education[keep].astype(np.int64) * self.n_years + engine.year_codes[keep]
+        salaries = salary_values[keep]
+        order = np.lexsort((salaries, partition))
+        self.values = salaries[order]
+        self.sizes = np.bincount(partition, minlength=education_slots * self.n_years)
+        self.starts = np.r_[0, np.cumsum(self.sizes)]
+        self.sums = np.bincount(partition, weights=salaries, minlength=len(self.sizes))
+
+        # The salary at the middle rank of each of sketch_points equal
+        # slices of every non-empty partition
+        filled = self.sizes > 0
+        middles = (np.arange(sketch_points) + 0.5) / sketch_points
+        ranks = np.floor(self.sizes[filled][:, np.newaxis] * middles).astype(np.intp)
+        self.sketch = np.zeros((len(self.sizes), sketch_points))
+        self.sketch[filled] = self.values[self.starts[:-1][filled][:, np.newaxis] + ranks]
+
+    def partitions(self, years, education_levels=None):
+        """(education code, first partition, end partition) per education level
+        with salaries in the year range."""
+        first = min(max(int(years[0]) - self.year_min, 0), self.n_years)
+        end = min(max(int(years[1]) - self.year_min + 1, first), self.n_years)
+        if education_levels:
+            codes = np.unique(self.engine.resolve('min_edulevels_name', education_levels))
+        else:
+            codes = range(self.n_education)
+        selection = []
+        for code in codes:
+            base = int(code) * self.n_years
+            if self.starts[base + end] > self.starts[base + first]:
+                selection.append((int(code), base + first, base + end))
+        return selection
+
+    def count(self, selection):
+        return int(sum(self.starts[end] - self.starts[first] for _, first, end in selection))
+
+    def points(self, selection):
+        # Education codes and salaries of the selection, for raw-point boxes
+        salaries = [self.values[self.starts[first]:self.starts[end]] for _, first, end in selection]
+        codes = [np.full(len(values), code) for (code, _, _), values in zip(selection, salaries)]
+        if not salaries:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        return np.concatenate(codes), np.concatenate(salaries)
+
+    def approximate(self, selection):
+        return self.mode == 'approx' or (self.mode == 'auto' and self.count(selection) > APPROX_SALARIES)
+
+    def summary(self, selection, max_outliers=MAX_OUTLIERS):
+        """box_summary of the selection (see partitions), exact or from the
+        sketches depending on the mode."""
+        if not selection:
+            return empty_summary()
+        if self.approximate(selection):
+            return self.sketch_summary(selection, max_outliers)
+        # Each slice is one sorted run per year; a stable sort merges them
+        runs = [np.sort(self.values[self.starts[first]:self.starts[end]], kind='stable')
+                for _, first, end in selection]
+        starts = np.r_[0, np.cumsum([len(run) for run in runs])[:-1]]
+        groups = np.array([code for code, _, _ in selection], dtype=np.intp)
+        return sorted_summary(groups, np.concatenate(runs), starts, max_outliers)
+
+    def sketch_summary(self, selection, max_outliers=MAX_OUTLIERS):
+        stats = {name: [] for name in ('group', 'count', 'lowerfence', 'upperfence', 'mean', 'outliers')}
+        stats.update({name: [] for name in QUANTILES})
+        for code, first, end in selection:
+            sizes = self.sizes[first:end]
+            points = self.sketch[first:end][sizes > 0]
+            weights = np.repeat(sizes[sizes > 0] / points.shape[1], points.shape[1])
+            estimates = sketch_quantiles(points.ravel(), weights, list(QUANTILES.values()))
+            for name, value in zip(QUANTILES, estimates):
+                stats[name].append(value)
+
+            # Whiskers and outliers: binary searches in each year's run
+            q1, q3 = stats['q1'][-1], stats['q3'][-1]
+            low_bound, high_bound = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+            lowerfence, upperfence, outliers = np.inf, -np.inf, []
+            for partition in range(first, end):
+                run = self.values[self.starts[partition]:self.starts[partition + 1]]
+                low = np.searchsorted(run, low_bound, side='left')
+                high = np.searchsorted(run, high_bound, side='right')
+                if high > low:
+                    lowerfence = min(lowerfence, run[low])
+                    upperfence = max(upperfence, run[high - 1])
+                outliers.extend([run[:low], run[high:]])
+            stats['lowerfence'].append(lowerfence)
+            stats['upperfence'].append(upperfence)
+            stats['outliers'].append(sample_outliers(np.sort(np.concatenate(outliers)), max_outliers))
+
+            count = int(sizes.sum())
+            stats['group'].append(code)
+            stats['count'].append(count)
+            stats['mean'].append(self.sums[first:end].sum() / count)
+        summary = {name: np.array(values) for name, values in stats.items() if name != 'outliers'}
+        summary['outliers'] = stats['outliers']
+        summary['approximate'] = True
+        return summary
@@ -0,0 +1,103 @@
+"""Server-side search for the skill dropdowns.
+
+Shipping every distinct skill as dropdown options makes the layout grow
+with the skill cardinality, four times over (one dropdown per tab), and
+leaves the browser searching thousands of options. Instead the dropdowns
+start with the SEARCH_LIMIT skills with the most postings and ask the
+server for matches as the user types.
+
+SkillIndex keeps the lower-cased word tokens of every skill name in one
+sorted list, so the skills with a token starting with a query token are a
+bisect range. A query matches a skill when each of its tokens prefixes one
+of the skill's tokens, in any order ("learn mach" finds "Machine
+Learning"). Skills are numbered by descending posting count, so matches
+come out ranked by frequency and only the first SEARCH_LIMIT are returned.
+"""
+import re
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+SEARCH_LIMIT = 50
+
+# Words, keeping the characters of names like C++, C# or Node.js
+TOKEN = re.compile(r"[\w+#]+(?:\.[\w+#]+)*")
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class SkillIndex:
+    def __init__(self, names, counts, codes=None):
+        # Rank 0 is the skill with the most postings; ties in name order
+        order = sorted(range(len(names)), key=lambda i: (-counts[i], names[i]))
+        self.names = [names[i] for i in order]
+        self.rank = {name: rank for rank, name in enumerate(self.names)}
+        self.counts = np.asarray(counts, dtype=np.int64)[order]
+        # Filter engine code of each rank, for facet counts (facets.py)
+        self.codes = (np.arange(len(names)) if codes is None else np.asarray(codes))[order]
+        pairs = sorted((token, rank) for rank, name in enumerate(self.names) for token in set(tokenize(name)))
+        self.tokens = [token for token, _ in pairs]
+        self.ranks = np.array([rank for _, rank in pairs], dtype=np.intp)
+
+    @classmethod
+    def from_engine(cls, engine, column='skill_name'):
+        # Skills that occur in the postings, with their posting counts
+        codes = engine.codes[column]
+        counts = np.bincount(codes[codes >= 0], minlength=len(engine.categories[column]))
+        present = np.flatnonzero(counts)
+        names = [str(name) for name in np.asarray(engine.categories[column])[present]]
+        return cls(names, counts[present], present)
+
+    def __len__(self):
+        return len(self.names)
+
+    def prefixed(self, token):
+        # Ranks of the skills with a token starting with `token`
+        low = bisect_left(self.tokens, token)
+        high = bisect_right(self.tokens, token + '\U0010ffff', low)
+        return np.unique(self.ranks[low:high])
+
+    def matches(self, query):
+        """Ascending ranks of the skills matching the query (None for all)."""
+        ranks = None
+        # Longer tokens match fewer skills, so they narrow the set first
+        for token in sorted(set(tokenize(query or '')), key=len, reverse=True):
+            found = self.prefixed(token)
+            ranks = found if ranks is None else np.intersect1d(ranks, found, assume_unique=True)
+            if not len(ranks):
+                break
+        return ranks
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Names of the most frequent skills matching the query."""
+        ranks = self.matches(query)
+        if ranks is None:
+            return self.names[:limit]
+        return [self.names[rank] for rank in ranks[:limit]]
+
+    def options(self, query=None, selected=None, limit=SEARCH_LIMIT, counts=None):
+        """Dropdown options for a search; selected skills always stay listed.
+
+        With `counts` (facet counts per skill code) matches are ranked by
+        them instead, labelled with them, and left out when zero."""
+        if counts is None:
+            values = self.search(query, limit)
+        else:
+            ranks = self.matches(query)
+            if ranks is None:
+                ranks = np.arange(len(self.names))
+            found = counts[self.codes[ranks]]
+            keep = np.flatnonzero(found)
+            values = [self.names[rank] for rank in ranks[keep[np.argsort(-found[keep], kind='stable')[:limit]]]]
+        shown = set(values)
+        values = [value for value in selected or [] if value not in shown] + values
+        if counts is None:
+            return [{'label': value, 'value': value} for value in values]
+        return [{'label': f"{value} ({self.count(value, counts):,})", 'value': value} for value in values]
+
+    def count(self, value, counts):
+        # Facet count of a skill name; 0 for names not in the postings
+        rank = self.rank.get(value)
+        return int(counts[self.codes[rank]]) if rank is not None else 0
@@ -0,0 +1,163 @@
+"""Checks of the salary, top-city and count cube indexes against pandas.
+
+Run with `python -m pytest -q`. Each index is compared with the plain
+groupby / quantile / value_counts it replaces, on a small synthetic frame.
+"""
+import numpy as np
+import pytest
+
+from benchmark import synthetic_postings
+from count_cube import CountCube
+from filter_engine import FilterEngine
+from quantile_index import SalaryIndex
+from top_k import CityTopK
+
+ROWS = 20_000
+YEARS = (2012, 2019)
+EDUCATION = ["Bachelor's degree", "Master's degree"]
+
+
+@pytest.fixture(scope='module')
+def df():
+    return synthetic_postings(ROWS, cities=300)
+
+
+@pytest.fixture(scope='module')
+def appended(df):
+    # The frame split in two: a base ending in 2020 and the full frame with
+    # a new city and some postings without a city among the appended rows
+    full = df.copy()
+    full['city_name'] = full['city_name'].cat.add_categories(['City new'])
+    start = int(np.searchsorted(full['year'].to_numpy(), 2021))
+    tail = full.index[start:]
+    full.loc[tail[::7], 'city_name'] = 'City new'
+    full.loc[tail[3::11], 'city_name'] = np.nan
+    base = full.iloc[:start].copy()
+    base['city_name'] = base['city_name'].cat.remove_categories(['City new'])
+    return base, full
+
+
+def selected(df, years, education_levels=None):
+    keep = df['year'].between(*years)
+    if education_levels:
+        keep &= df['min_edulevels_name'].isin(education_levels)
+    return df[keep]
+
+
+def salary_groups(df, years, education_levels=None):
+    rows = selected(df, years, education_levels).dropna(subset=['salary'])
+    return rows.groupby('min_edulevels_name', observed=True)['salary']
+
+
+@pytest.mark.parametrize('education_levels', [None, EDUCATION])
+def test_salary_exact_matches_quantile(df, education_levels):
+    engine = FilterEngine(df)
+    index = SalaryIndex(engine, df['salary'].to_numpy(dtype=float), mode='exact')
+    summary = index.summary(index.partitions(YEARS, education_levels))
+    groups = salary_groups(df, YEARS, education_levels)
+
+    names = engine.labels('min_edulevels_name', summary['group'])
+    assert list(names) == list(groups.size().index)
+    assert np.array_equal(summary['count'], groups.size().to_numpy())
+    np.testing.assert_allclose(summary['mean'], groups.mean().to_numpy())
+    for name, q in (('p10', 0.1), ('q1', 0.25), ('median', 0.5), ('q3', 0.75), ('p90', 0.9)):
+        np.testing.assert_allclose(summary[name], groups.quantile(q).to_numpy(), err_msg=name)
+
+
+@pytest.mark.parametrize('sketch_points', [8, 128])
+def test_salary_approx_within_rank_bound(df, sketch_points):
+    engine = FilterEngine(df)
+    index = SalaryIndex(engine, df['salary'].to_numpy(dtype=float), mode='approx',
+                        sketch_points=sketch_points)
+    summary = index.summary(index.partitions(YEARS))
+    assert summary['approximate']
+
+    groups = dict(list(salary_groups(df, YEARS)))
+    for i, code in enumerate(summary['group']):
+        salaries = np.sort(groups[engine.labels('min_edulevels_name', code)].to_numpy())
+        n = len(salaries)
+        assert summary['count'][i] == n
+        assert summary['mean'][i] == pytest.approx(salaries.mean())
+        bound = n / (2 * sketch_points) + 1
+        for name, q in (('p10', 0.1), ('q1', 0.25), ('median', 0.5), ('q3', 0.75), ('p90', 0.9)):
+            # Ranks the estimate occupies in the selection's salaries
+            low = np.searchsorted(salaries, summary[name][i], side='left')
+            high = np.searchsorted(salaries, summary[name][i], side='right') - 1
+            assert high >= low, name
+            position = q * (n - 1)
+            assert max(low - position, position - high, 0) <= bound, name
+
+
+def true_city_counts(df, years, **filters):
+    rows = selected(df, years, filters.get('education_levels'))
+    return rows['city_name'].value_counts()
+
+
+@pytest.mark.parametrize('education_levels', [None, EDUCATION])
+def test_top_cities_exact(df, education_levels):
+    engine = FilterEngine(df)
+    top = CityTopK(engine, engine, mode='exact').top(YEARS, education_levels=education_levels)
+    expected = true_city_counts(df, YEARS, education_levels=education_levels)
+
+    assert sorted(top['count']) == sorted(expected.nlargest(10))
+    assert (top['count'].to_numpy() == expected[top['city_name']].to_numpy()).all()
+    assert not top['error'].any()
+
+
+def test_top_cities_approx_bounds(df):
+    engine = FilterEngine(df)
+    # A summary about as small as K, so some top cities miss some years
+    top_k = CityTopK(engine, engine, mode='approx', summary_size=10)
+    top = top_k.top(YEARS)
+    expected = true_city_counts(df, YEARS)
+
+    true = expected[top['city_name']].to_numpy()
+    assert len(top) == 10 and top['error'].any()
+    assert (top['count'].to_numpy() <= true).all()
+    assert (true <= top['count'].to_numpy() + top['error'].to_numpy()).all()
+
+    # Filtered queries stay exact
+    filtered = top_k.top(YEARS, education_levels=EDUCATION)
+    assert sorted(filtered['count']) == sorted(true_city_counts(df, YEARS, education_levels=EDUCATION).nlargest(10))
+    assert not filtered['error'].any()
+
+
+def cube_counts(table, columns):
+    return table.set_index(columns)['count'].sort_index()
+
+
+def groupby_counts(df, columns, years, education_levels=None):
+    counts = selected(df, years, education_levels).groupby(columns, observed=True).size()
+    return counts[counts > 0].rename('count').sort_index()
+
+
+@pytest.mark.parametrize('columns', [['min_edulevels_name'], ['year', 'min_edulevels_name'], ['city_name']])
+def test_cube_extend_after_append(appended, columns):
+    base, full = appended
+    engine = FilterEngine(base).extend(full)
+    assert engine is not None
+    cube = CountCube.build(FilterEngine(base), max_ratio=1).extend(engine, max_ratio=1)
+    rebuilt = CountCube.build(FilterEngine(full), max_ratio=1)
+    assert len(cube) == len(rebuilt)
+
+    for years, education_levels in (((2010, 2023), None), ((2019, 2023), EDUCATION)):
+        expected = groupby_counts(full, columns, years, education_levels)
+        for source in (cube, engine):
+            counts = cube_counts(source.count_by(columns, years, education_levels=education_levels), columns)
+            assert np.array_equal(counts.to_numpy(), expected.to_numpy())
+            assert list(counts.index) == list(expected.index)
+
+
+def test_top_cities_extend_after_append(appended):
+    base, full = appended
+    base_engine = FilterEngine(base)
+    engine = base_engine.extend(full)
+    top_k = CityTopK(base_engine, base_engine, mode='exact').extend(engine, engine)
+
+    for years in ((2010, 2023), (2021, 2023)):
+        top = top_k.top(years, k=len(engine.categories['city_name']))
+        expected = true_city_counts(full, years)
+        expected = expected[expected > 0]
+        assert dict(zip(top['city_name'], top['count'])) == expected.to_dict()
+    assert 'City new' in set(top['city_name'])
+
@@ -0,0 +1,168 @@
+"""Top cities for the Geographic tab.
+
+The tab only shows the K cities with the most postings, but counting every
+city of the matching rows and sorting them gets expensive once there are
+tens of thousands of distinct locations. CityTopK keeps small count cubes
+over (year, city) and (year, one dropdown column, city), so a query with at
+most one active dropdown sums the matching cells into one count vector over
+the city codes; argpartition then picks the top K without sorting the rest.
+Queries that combine several dropdowns count the city column of the rows
+(or cube cells) the filter engine selects.
+
+For very high-cardinality location data the exact per-year city counts can
+be replaced by a heavy-hitter summary: for each year only the SUMMARY_SIZE
+most frequent cities are kept, together with the largest count left out.
+Summing a year range gives a lower bound for every city and an upper bound
+that adds the left-out counts of the years the city is missing from, so
+each approximate result carries its error bound. The summary is used for
+unfiltered queries only; filtered ones stay exact.
+"""
+import copy
+import os
+
+import numpy as np
+import pandas as pd
+
+from count_cube import CountCube
+from filter_engine import FILTER_COLUMNS
+
+TOP_K = 10
+
+# 'exact', 'approx' or 'auto' (approx above APPROX_CITIES distinct cities)
+MODE = os.environ.get('DASHBOARD_CITY_TOPK', 'auto')
+APPROX_CITIES = 100_000
+SUMMARY_SIZE = 1000
+
+
+def top_k(counts, k):
+    # Codes of the k largest non-zero counts in code order; ties at the
+    # boundary go to the lowest codes, like nlargest(keep='first')
+    k = min(k, np.count_nonzero(counts))
+    if not k:
+        return np.empty(0, dtype=np.intp)
+    kth = np.partition(counts, len(counts) - k)[len(counts) - k]
+    above = np.flatnonzero(counts > kth)
+    tied = np.flatnonzero(counts == kth)[:k - len(above)]
+    return np.sort(np.r_[above, tied])
+
+
+class CitySummary:
+    """Per-year heavy-hitter summary of the city counts."""
+
+    def __init__(self, year_values, codes, counts, offsets, left_out, n_cities):
+        self.year_values = year_values
+        self.codes = codes
+        self.counts = counts
+        self.offsets = offsets
+        self.left_out = left_out
+        self.n_cities = n_cities
+
+    @classmethod
+    def build(cls, engine, size=SUMMARY_SIZE):
+        # One pass per year over that year's rows; only one dense count
+        # vector is alive at a time
+        n_cities = len(engine.categories['city_name'])
+        codes, counts, left_out = [], [], []
+        for i in range(len(engine.year_values)):
+            city = engine.codes['city_name'][engine.year_offsets[i]:engine.year_offsets[i + 1]]
+            year_counts = np.bincount(city[city >= 0], minlength=n_cities)
+            kept = top_k(year_counts, size)
+            codes.append(kept)
+            counts.append(year_counts[kept])
+            year_counts[kept] = 0
+            left_out.append(int(year_counts.max()) if n_cities else 0)
+        offsets = np.r_[0, np.cumsum([len(kept) for kept in codes])]
+        return cls(engine.year_values, np.concatenate(codes or [np.empty(0, dtype=np.intp)]),
+                   np.concatenate(counts or [np.empty(0, dtype=np.int64)]), offsets,
+                   np.array(left_out, dtype=np.int64), n_cities)
+
+    def top(self, years, k):
+        """(codes, lower bounds, upper bounds) of the estimated top k cities."""
+        first = np.searchsorted(self.year_values, years[0], side='left')
+        last = np.searchsorted(self.year_values, years[1], side='right')
+        cells = slice(self.offsets[first], self.offsets[last])
+        # Only the summarized cities take part, never a vector over all cities
+        codes, inverse = np.unique(self.codes[cells], return_inverse=True)
+        lower = np.bincount(inverse, weights=self.counts[cells], minlength=len(codes))
+        # A city absent from a year's summary had at most that year's
+        # left-out count there
+        year_of_cell = np.repeat(np.arange(first, last), np.diff(self.offsets[first:last + 1]))
+        covered = np.bincount(inverse, weights=self.left_out[year_of_cell], minlength=len(codes))
+        error = self.left_out[first:last].sum()
+        top = top_k(lower, k)
+        return codes[top], lower[top].astype(np.int64), (lower[top] + error - covered[top]).astype(np.int64)
+
+
+class CityTopK:
+    def __init__(self, engine, counter, mode=MODE, summary_size=SUMMARY_SIZE):
+        self.engine = engine
+        # Cube or engine answering multi-dropdown queries (Dataset.city_counter)
+        self.counter = counter
+        self.n_cities = len(engine.categories['city_name'])
+        self.approx = mode == 'approx' or (mode == 'auto' and self.n_cities > APPROX_CITIES)
+        self.summary_size = summary_size
+        self.summary = CitySummary.build(engine, summary_size) if self.approx else None
+        # Dropdown argument (None for no dropdown) -> (year, column, city) cube
+        self.cubes = {None: None if self.approx else CountCube.build(engine, ('year', 'city_name'), max_ratio=1)}
+        for argument, column in FILTER_COLUMNS.items():
+            self.cubes[argument] = CountCube.build(engine, ('year', column, 'city_name'), max_ratio=1)
+
+    def city_counts(self, source, selection):
+        # Count vector over the city codes of selected rows or cube cells
+        if isinstance(source, CountCube):
+            codes = source.coords['city_name'][selection]
+            weights = source.counts[selection]
+        else:
+            codes, _ = source.dimension('city_name', selection)
+            weights = None
+        counts = np.bincount(codes, weights=weights, minlength=self.n_cities + 1)
+        # The last slot holds postings without a city
+        return counts[:self.n_cities].astype(np.int64)
+
+    def counts(self, years, skills=None, education_levels=None, skill_subcategories=None):
+        """Exact posting counts per city code for the filters."""
+        selections = {
+            'skills': skills,
+            'education_levels': education_levels,
+            'skill_subcategories': skill_subcategories,
+        }
+        active = {argument: values for argument, values in selections.items() if values}
+        if len(active) <= 1:
+            cube = self.cubes[next(iter(active), None)]
+            if cube is not None:
+                return self.city_counts(cube, cube.select(years, **active))
+        return self.city_counts(self.counter, self.counter.select(years, **active))
+
+    def top(self, years, skills=None, education_levels=None, skill_subcategories=None, k=TOP_K):
+        """The k cities with the most matching postings, in city order.
+
+        Returns a frame of city_name, count and error: the most the true count
+        can exceed `count` (0 unless the approximate summary answered)."""
+        if self.approx and not (skills or education_levels or skill_subcategories):
+            codes, lower, upper = self.summary.top(years, k)
+            error = upper - lower
+        else:
+            counts = self.counts(years, skills, education_levels, skill_subcategories)
+            codes = top_k(counts, k)
+            lower = counts[codes]
+            error = np.zeros(len(codes), dtype=np.int64)
+        return pd.DataFrame({
+            'city_name': self.engine.categories['city_name'].take(codes).to_numpy(),
+            'count': lower,
+            'error': error,
+        })
+
+    def extend(self, engine, counter):
+        """CityTopK for an extension of this one's engine (FilterEngine.extend)."""
+        # The cubes take in the appended rows only; the summary is rebuilt
+        extended = copy.copy(self)
+        extended.engine = engine
+        extended.counter = counter
+        extended.n_cities = len(engine.categories['city_name'])
+        if self.approx:
+            extended.summary = CitySummary.build(engine, self.summary_size)
+        extended.cubes = {
+            argument: cube.extend(engine, max_ratio=1) if cube is not None else None
+            for argument, cube in self.cubes.items()
+        }
+        return extended